@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Job progress streams (products.streams) are served directly on the event
+loop; every other request goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -14,4 +16,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the streams use models and settings
+from products.streams import match, progress_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        route = match(scope['path'])
+        if route:
+            return await progress_app(scope, receive, send, *route)
+    return await django_application(scope, receive, send)
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import task_postrun, worker_init, worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
@@ -9,4 +10,29 @@ app.autodiscover_tasks()
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
+
+
+@worker_init.connect
+def preload_rembg_session(**kwargs):
+    """Load the rembg model in the parent so prefork children inherit it"""
+    from django.conf import settings
+    if settings.REMBG_PRELOAD:
+        from generation.engine import get_session_manager
+        get_session_manager().preload()
+
+
+@worker_process_init.connect
+def init_rembg_session(**kwargs):
+    """Make sure each child has a usable session before it takes its first job"""
+    from django.conf import settings
+    if settings.REMBG_PRELOAD:
+        from generation.engine import get_session_manager
+        get_session_manager().get()
+
+
+@task_postrun.connect
+def report_worker_memory(**kwargs):
+    """Publish this worker process's RSS for /metrics/ after every task"""
+    from core.metrics import report_worker_rss
+    report_worker_rss()
@@ -0,0 +1,189 @@
+"""
+Cross-process metrics for the render pipeline, aggregated in Redis.
+
+Celery workers record histogram observations and counters here; the web
+process renders them in the Prometheus text format (core.views.metrics).
+Recording is best effort: a Redis error is logged and never fails a job.
+"""
+from django.conf import settings
+import os
+import resource
+import socket
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from .redis_client import get_broker_redis, get_redis
+
+# Seconds; covers a cache hit on a text block up to a cold rembg run on CPU
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+SERIES_INDEX = 'metrics:series'
+COUNTERS = 'metrics:counters'
+WORKER_RSS = 'metrics:worker_rss'
+# Workers that haven't reported for this long are left out of the output
+WORKER_STALE_SECONDS = 300
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+def histogram_key(name, labels):
+    return f"metrics:histogram:{name}{format_labels(labels)}"
+
+
+def _observe(pipe, name, seconds, labels=None):
+    key = histogram_key(name, labels)
+    pipe.sadd(SERIES_INDEX, key)
+    for bound in BUCKETS:
+        if seconds <= bound:
+            pipe.hincrby(key, repr(bound), 1)
+    pipe.hincrby(key, 'count', 1)
+    pipe.hincrbyfloat(key, 'sum', seconds)
+
+
+def observe(name, seconds, labels=None):
+    """Record one observation of a histogram"""
+    record([(name, seconds, labels)])
+
+
+def record(observations=(), counters=()):
+    """
+    Record several histogram observations (name, seconds, labels) and
+    counter increments (name, amount, labels) in one round trip
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for name, seconds, labels in observations:
+            _observe(pipe, name, seconds, labels)
+        for name, amount, labels in counters:
+            if amount:
+                pipe.hincrbyfloat(COUNTERS, f"{name}{format_labels(labels)}", amount)
+        pipe.execute()
+    except RedisError as e:
+        print(f"Warning: Could not record metrics: {e}")
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSS:
+    """Samples this process's RSS in a background thread; .peak is the high-water mark in bytes"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def report_worker_rss():
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        get_redis().hset(WORKER_RSS, worker, f"{current_rss()} {time.time():.0f}")
+    except RedisError as e:
+        print(f"Warning: Could not record worker RSS: {e}")
+
+
+def queue_depths():
+    """
+    Messages waiting per Celery queue (Redis broker: one list per queue).
+    Empty if the broker can't be read, so the queue gauges are left out
+    rather than failing the rest of the scrape.
+    """
+    try:
+        broker = get_broker_redis()
+        return {queue: broker.llen(queue) for queue in settings.METRICS_QUEUES}
+    except Exception as e:
+        print(f"Warning: Could not read Celery queue depths: {e}")
+        return {}
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    client = get_redis()
+    lines = []
+
+    histograms = {}
+    for key in sorted(client.smembers(SERIES_INDEX)):
+        series = key[len('metrics:histogram:'):]
+        name, _, labels = series.partition('{')
+        histograms.setdefault(name, []).append((labels.rstrip('}'), client.hgetall(key)))
+    for name, series in histograms.items():
+        lines.append(f"# TYPE {name} histogram")
+        for labels, fields in series:
+            prefix = labels + ',' if labels else ''
+            for bound in BUCKETS:
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {fields.get(repr(bound), 0)}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {fields.get("count", 0)}')
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f"{name}_sum{suffix} {float(fields.get('sum', 0)):.6f}")
+            lines.append(f"{name}_count{suffix} {fields.get('count', 0)}")
+
+    counters = {}
+    for series, value in sorted(client.hgetall(COUNTERS).items()):
+        name = series.partition('{')[0]
+        counters.setdefault(name, []).append((series, float(value)))
+    for name, series in counters.items():
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{labelled} {value:g}" for labelled, value in series)
+
+    # Hit ratio per cache since the counters were created, for dashboards without PromQL
+    lookups = {}
+    for series, value in counters.get('render_cache_lookups_total', []):
+        cache = series.split('cache="')[1].split('"')[0]
+        hits, total = lookups.get(cache, (0.0, 0.0))
+        lookups[cache] = (hits + (value if 'result="hit"' in series else 0.0), total + value)
+    if lookups:
+        lines.append("# TYPE render_cache_hit_ratio gauge")
+        for cache, (hits, total) in sorted(lookups.items()):
+            lines.append(f'render_cache_hit_ratio{{cache="{cache}"}} {hits / total if total else 0:.4f}')
+
+    depths = queue_depths()
+    if depths:
+        lines.append("# TYPE celery_queue_length gauge")
+    for queue, depth in depths.items():
+        lines.append(f'celery_queue_length{{queue="{queue}"}} {depth}')
+
+    lines.append("# TYPE worker_resident_memory_bytes gauge")
+    now = time.time()
+    for worker, value in sorted(client.hgetall(WORKER_RSS).items()):
+        rss, reported = value.split()
+        if now - float(reported) > WORKER_STALE_SECONDS:
+            # Worker process is gone (or idle); recycled pids would otherwise pile up
+            client.hdel(WORKER_RSS, worker)
+            continue
+        lines.append(f'worker_resident_memory_bytes{{worker="{worker}"}} {rss}')
+
+    return '\n'.join(lines) + '\n'
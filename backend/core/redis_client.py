@@ -0,0 +1,45 @@
+from django.conf import settings
+import threading
+
+import redis
+import redis.asyncio
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_broker_client = None
+
+
+def get_redis():
+    """Shared synchronous client (thread-safe connection pool), created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_broker_redis():
+    """
+    Client for the Celery broker's Redis: the shared client when the broker is
+    REDIS_URL (the default), else one of its own, created on first use.
+    Raises ValueError if the broker isn't Redis.
+    """
+    global _broker_client
+    if settings.CELERY_BROKER_URL == settings.REDIS_URL:
+        return get_redis()
+    with _client_lock:
+        if _broker_client is None:
+            _broker_client = redis.Redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    return _broker_client
+
+
+def get_async_redis():
+    """
+    Shared asyncio client for the ASGI app. Its pool is bound to the event loop
+    that first uses it, which is the server's single loop per worker process.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _async_client
@@ -101,11 +101,25 @@ if USE_S3:
     AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
     AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
     AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
-    AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
+    # Any S3-compatible endpoint, e.g. http://localhost:9000 for the minio service
+    # in docker-compose (profile "s3"), which integration tests can run against
+    AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+    if AWS_S3_ENDPOINT_URL:
+        AWS_S3_ADDRESSING_STYLE = 'path'
+    else:
+        AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
     AWS_S3_FILE_OVERWRITE = False
     AWS_DEFAULT_ACL = 'public-read'
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
+    # Files above the threshold upload as multipart, several parts at a time
+    from boto3.s3.transfer import TransferConfig
+    AWS_S3_TRANSFER_CONFIG = TransferConfig(
+        multipart_threshold=int(os.getenv('AWS_S3_MULTIPART_THRESHOLD_MB', '8')) * 1024 * 1024,
+        multipart_chunksize=int(os.getenv('AWS_S3_MULTIPART_CHUNK_MB', '8')) * 1024 * 1024,
+        max_concurrency=int(os.getenv('AWS_S3_MULTIPART_CONCURRENCY', '4')),
+    )
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # CORS Settings - UPDATED
@@ -147,6 +161,95 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Redis for everything besides Celery (job progress pub/sub); defaults to the broker
+REDIS_URL = os.getenv('REDIS_URL', CELERY_BROKER_URL)
+# Live job progress is kept in Redis this long after the last update
+JOB_PROGRESS_TTL = int(os.getenv('JOB_PROGRESS_TTL', '3600'))
+# Repeated generate_images requests for the same product, templates and inputs get the
+# job already queued or running (see products/coalesce.py). The request-to-job mapping
+# expires after JOB_COALESCE_TTL; the lock is held for at most JOB_COALESCE_LOCK_TIMEOUT
+JOB_COALESCE_TTL = int(os.getenv('JOB_COALESCE_TTL', '3600'))
+JOB_COALESCE_LOCK_TIMEOUT = int(os.getenv('JOB_COALESCE_LOCK_TIMEOUT', '10'))
+# Logos and templates are cached per process; changes propagate through Redis at once,
+# this is only the fallback lifetime when Redis is unreachable
+CONFIG_CACHE_TTL = int(os.getenv('CONFIG_CACHE_TTL', '60'))
+# Celery queues, by lane and stage, so each gets workers and concurrency of its own.
+# segment: background removal (rembg; CPU- and memory-heavy). render: compositing,
+# encoding and the upload stage (RENDER_UPLOAD_THREADS). Single-product requests take the
+# interactive lane and batches the bulk lane, so a catalog-wide batch never sits in front
+# of a merchandiser's request. E.g. one worker per queue:
+#   celery -A core worker -Q segment -c 2          (REMBG_PRELOAD=True)
+#   celery -A core worker -Q render -c 4
+#   celery -A core worker -Q bulk_segment,bulk_render,celery -c 4
+RENDER_QUEUES = {
+    'interactive': {'segment': 'segment', 'render': 'render'},
+    'bulk': {'segment': 'bulk_segment', 'render': 'bulk_render'},
+}
+# Defaults for tasks sent without a queue; jobs pick their lane's queue when dispatched
+CELERY_TASK_ROUTES = {
+    'products.tasks.prepare_cutout': {'queue': 'segment'},
+    'products.tasks.generate_product_images': {'queue': 'segment'},
+    'products.tasks.render_job': {'queue': 'render'},
+    'products.tasks.render_template': {'queue': 'render'},
+    'products.tasks.finalize_job': {'queue': 'render'},
+    'products.tasks.enqueue_batch': {'queue': 'bulk_segment'},
+}
+# Reserve one message per worker process at a time, so a worker busy with long renders
+# doesn't sit on queued work another worker could start
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1'))
+# Celery queues whose depth is exported on /metrics/
+METRICS_QUEUES = ['celery'] + [queue for lane in RENDER_QUEUES.values() for queue in lane.values()]
+# Split generation jobs into one subtask per template (chord) so templates render in parallel
+RENDER_FANOUT = os.getenv('RENDER_FANOUT', 'True') == 'True'
+# Render each job's templates in a local pool of this many processes (0: off), with the
+# cutout and base plates in shared memory. Takes precedence over RENDER_FANOUT. Needs
+# --pool=threads or solo: prefork children are flagged daemonic (by billiard, and seen as
+# such by the stdlib multiprocessing), which ProcessPoolExecutor refuses to start from
+RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', '0'))
+# Products per chunk when a batch enqueues its jobs
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '500'))
+
+# Rendering
+# Compiled template layers (base plates etc.) are cached here across worker restarts
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', os.path.join(BASE_DIR, '.render_cache'))
+RENDER_PLATE_CACHE_SIZE = int(os.getenv('RENDER_PLATE_CACHE_SIZE', '8'))
+# Plates on disk (a PNG pair per spec/asset/logo version) are pruned, least recently used
+# first, once they pass this size; 0: never pruned
+RENDER_PLATE_CACHE_DISK_MB = int(os.getenv('RENDER_PLATE_CACHE_DISK_MB', '512'))
+# Memory budget for decoded backgrounds/overlays/logos, per worker process
+RENDER_ASSET_CACHE_MB = int(os.getenv('RENDER_ASSET_CACHE_MB', '256'))
+# Resampling for product placement (one affine warp, see generation/transform.py):
+# 'area' (averages when shrinking), 'linear' (fastest) or 'lanczos' (sharpest).
+# Templates can override it with "quality" in their product_position
+RENDER_RESAMPLE_QUALITY = os.getenv('RENDER_RESAMPLE_QUALITY', 'area')
+# Default TrueType font for template text (installed by fonts-dejavu in the Docker image)
+RENDER_FONT_PATH = os.getenv('RENDER_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf')
+# Output encoding preset: png, png_fast, png_optimized, webp_lossless, jpeg (see generation/encoding.py)
+# Templates can override it with "output_preset" in their spec
+RENDER_OUTPUT_PRESET = os.getenv('RENDER_OUTPUT_PRESET', 'png')
+RENDER_ENCODE_THREADS = int(os.getenv('RENDER_ENCODE_THREADS', '2'))
+# Released canvases are kept for reuse up to this size, per worker process
+RENDER_BUFFER_POOL_MB = int(os.getenv('RENDER_BUFFER_POOL_MB', '96'))
+# Renders in flight per worker process are admitted while their estimated footprint
+# (~64MB for a 2000x2000 canvas) fits; 0: no limit.
+# Bounds each child's peak, so Celery concurrency can be sized from memory
+RENDER_MEMORY_BUDGET_MB = int(os.getenv('RENDER_MEMORY_BUDGET_MB', '0'))
+# Finished images upload to storage in the background, in this many threads per worker
+# process, while later templates render. Rendering waits once RENDER_UPLOAD_QUEUE uploads
+# are in flight. Failed uploads are retried with exponential backoff from
+# RENDER_UPLOAD_BACKOFF seconds, RENDER_UPLOAD_ATTEMPTS tries in all
+RENDER_UPLOAD_THREADS = int(os.getenv('RENDER_UPLOAD_THREADS', '4'))
+RENDER_UPLOAD_QUEUE = int(os.getenv('RENDER_UPLOAD_QUEUE', '8'))
+RENDER_UPLOAD_ATTEMPTS = int(os.getenv('RENDER_UPLOAD_ATTEMPTS', '4'))
+RENDER_UPLOAD_BACKOFF = float(os.getenv('RENDER_UPLOAD_BACKOFF', '0.5'))
+
+# Background removal (rembg / ONNX Runtime)
+REMBG_MODEL = os.getenv('REMBG_MODEL', 'u2net')
+# Load the model in the Celery parent before forking so children share it copy-on-write
+REMBG_PRELOAD = os.getenv('REMBG_PRELOAD', 'False') == 'True'
+# Keep these at 1 with REMBG_PRELOAD; multi-threaded sessions are rebuilt in each child
+REMBG_INTRA_OP_THREADS = int(os.getenv('REMBG_INTRA_OP_THREADS', '1'))
+REMBG_INTER_OP_THREADS = int(os.getenv('REMBG_INTER_OP_THREADS', '1'))
 
 # REST Framework - UPDATED
 REST_FRAMEWORK = {
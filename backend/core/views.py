@@ -0,0 +1,16 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from redis.exceptions import RedisError
+
+from .metrics import render_prometheus
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint for the render pipeline"""
+    try:
+        body = render_prometheus()
+    except RedisError as e:
+        return HttpResponse(f"# metrics unavailable: {e}\n", status=503, content_type='text/plain')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,298 @@
+from collections import OrderedDict
+from PIL import Image
+import threading
+import time
+import os
+
+
+class BasePlate:
+    """Static layers of a template, composited once and reused for every product"""
+
+    def __init__(self, base, top=None, top_offset=(0, 0)):
+        # base: background + overlays (everything below the product)
+        # top: static text + logo (everything above the product), cropped to its bbox
+        self.base = base
+        self.top = top
+        self.top_offset = top_offset
+
+
+class BasePlateCache:
+    """
+    Two-level (memory + disk) cache of compiled base plates.
+    Keys are fingerprints of the template spec, asset files and logo, so a
+    changed asset or spec simply produces a new key. Plates on disk are kept
+    up to max_disk_bytes (0: no limit); each store prunes the least recently
+    used ones (by file mtime, refreshed on every disk hit) beyond that.
+    """
+
+    # Temp files older than this are leftovers of a worker that died mid-write
+    STALE_TMP_SECONDS = 3600
+
+    def __init__(self, max_entries=8, cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            plate = self._entries.get(key)
+            if plate is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return plate
+
+        plate = self._load(key)
+        if plate is not None:
+            self.disk_hits += 1
+            self._remember(key, plate)
+        return plate
+
+    def get_or_build(self, key, builder):
+        plate = self.get(key)
+        if plate is None:
+            self.misses += 1
+            plate = builder()
+            self._remember(key, plate)
+            self._store(key, plate)
+        return plate
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, plate):
+        with self._lock:
+            self._entries[key] = plate
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.base.png", f"{base}.top.png"
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        base_path, top_path = self._paths(key)
+        if not os.path.exists(base_path):
+            return None
+        try:
+            # Mark the plate as recently used, for prune()
+            os.utime(base_path)
+            base = Image.open(base_path)
+            base.load()
+            top, offset = None, (0, 0)
+            if os.path.exists(top_path):
+                top = Image.open(top_path)
+                top.load()
+                # The offset is stored as PNG text so the plate is one self-describing file pair
+                offset = tuple(int(v) for v in top.info.get('offset', '0,0').split(','))
+            return BasePlate(base.convert('RGBA'), top.convert('RGBA') if top else None, offset)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read cached plate {key}: {e}")
+            return None
+
+    def _store(self, key, plate):
+        if not self.cache_dir:
+            return
+        from PIL.PngImagePlugin import PngInfo
+
+        base_path, top_path = self._paths(key)
+        try:
+            os.makedirs(os.path.dirname(base_path), exist_ok=True)
+            # Write to a temp name first so concurrent workers never read a half-written plate
+            tmp_base = f"{base_path}.{os.getpid()}.tmp"
+            plate.base.save(tmp_base, format='PNG', compress_level=1)
+            if plate.top is not None:
+                info = PngInfo()
+                info.add_text('offset', f"{plate.top_offset[0]},{plate.top_offset[1]}")
+                tmp_top = f"{top_path}.{os.getpid()}.tmp"
+                plate.top.save(tmp_top, format='PNG', compress_level=1, pnginfo=info)
+                os.replace(tmp_top, top_path)
+            os.replace(tmp_base, base_path)
+        except OSError as e:
+            print(f"Warning: Could not write cached plate {key}: {e}")
+        self.prune()
+
+    def prune(self):
+        """
+        Delete the least recently used plates on disk until they fit in
+        max_disk_bytes, and temp files left behind by interrupted writes.
+        Returns the number of bytes freed.
+        """
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        plates = []  # (mtime, bytes, [paths])
+        freed = 0
+        now = time.time()
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith('.tmp'):
+                        if now - stat.st_mtime > self.STALE_TMP_SECONDS:
+                            os.remove(path)
+                            freed += stat.st_size
+                        continue
+                    if not name.endswith('.base.png'):
+                        continue
+                    paths, size = [path], stat.st_size
+                    top_path = path[:-len('.base.png')] + '.top.png'
+                    if os.path.exists(top_path):
+                        paths.append(top_path)
+                        size += os.path.getsize(top_path)
+                except OSError:
+                    # Removed by another worker meanwhile
+                    continue
+                plates.append((stat.st_mtime, size, paths))
+
+        total = sum(size for _, size, _ in plates)
+        if not self.max_disk_bytes or total <= self.max_disk_bytes:
+            return freed
+        plates.sort()
+        for _, size, paths in plates:
+            if total <= self.max_disk_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            freed += size
+        return freed
+
+
+class AssetCache:
+    """
+    Process-wide, byte-budgeted LRU of decoded and resized RGBA assets
+    (backgrounds, overlays, logos).
+
+    Entries are keyed on (path, mtime, size, target), so editing a file on
+    disk produces a new key; older entries for the same path are dropped as
+    soon as the new version is seen. Cached images are shared, callers must
+    copy() them before drawing on them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (image, nbytes, load_seconds)
+        self._versions = {}  # path -> (mtime_ns, size) last seen
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Time spent decoding/resampling on misses, and the time hits saved us
+        self.load_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def get(self, path, scale=1.0, size=None):
+        """
+        Decoded RGBA image for path, resized to size or scaled by scale.
+        Returns None if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (str(path), version, tuple(size) if size else None, scale)
+
+        with self._lock:
+            if self._versions.get(key[0]) not in (None, version):
+                self._drop_path(key[0])
+            self._versions[key[0]] = version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                return entry[0]
+
+        started = time.perf_counter()
+        image = self._load(path, scale, size)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.misses += 1
+            self.load_seconds += elapsed
+            nbytes = image.width * image.height * len(image.getbands())
+            if nbytes <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (image, nbytes, elapsed)
+                self.current_bytes += nbytes
+                self._evict()
+        return image
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'load_seconds': round(self.load_seconds, 4),
+                'saved_seconds': round(self.saved_seconds, 4),
+            }
+
+    @staticmethod
+    def diff(before, after):
+        """Counters accumulated between two stats() snapshots, e.g. over one job"""
+        delta = {
+            key: round(after[key] - before[key], 4)
+            for key in ('hits', 'misses', 'evictions', 'load_seconds', 'saved_seconds')
+        }
+        lookups = delta['hits'] + delta['misses']
+        delta['hit_rate'] = round(delta['hits'] / lookups, 3) if lookups else 0.0
+        return delta
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.current_bytes = 0
+
+    def _load(self, path, scale, size):
+        image = Image.open(path)
+        if size:
+            # Resize before converting, so the resample runs on fewer bands when the source is RGB
+            image = image.resize(tuple(size), Image.Resampling.LANCZOS)
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+        if scale != 1.0:
+            new_size = tuple(int(dim * scale) for dim in image.size)
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        return image
+
+    def _drop_path(self, path):
+        for key in [k for k in self._entries if k[0] == path]:
+            self.current_bytes -= self._entries.pop(key)[1]
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes, _) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+
+_asset_cache = None
+
+def get_asset_cache():
+    """Process-wide asset cache, sized from Django settings"""
+    global _asset_cache
+    if _asset_cache is None:
+        from django.conf import settings
+        max_mb = getattr(settings, 'RENDER_ASSET_CACHE_MB', 256)
+        _asset_cache = AssetCache(max_bytes=max_mb * 1024 * 1024)
+    return _asset_cache
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import os
+
+# Output encoding presets. Timings/sizes for a typical 2000x2000 RGBA render:
+#   png            zlib level 6 (Pillow's default, what we always wrote)
+#   png_fast       ~45% less encode time, ~30% larger files
+#   png_optimized  ~4x slower than png, marginally smaller: for archival runs
+#   webp_lossless  ~40% smaller than png, slower to encode
+#   jpeg           ~10x faster and ~3x smaller; for templates without transparency
+PRESETS = {
+    'png': {
+        'format': 'PNG', 'extension': 'png', 'params': {},
+    },
+    'png_fast': {
+        'format': 'PNG', 'extension': 'png', 'params': {'compress_level': 1},
+    },
+    'png_optimized': {
+        'format': 'PNG', 'extension': 'png', 'params': {'optimize': True},
+    },
+    'webp_lossless': {
+        'format': 'WEBP', 'extension': 'webp', 'params': {'lossless': True, 'quality': 50, 'method': 2},
+    },
+    'jpeg': {
+        'format': 'JPEG', 'extension': 'jpg', 'params': {'quality': 90, 'optimize': True},
+        # JPEG has no alpha: flatten onto this colour if the canvas isn't opaque
+        'flatten_color': (255, 255, 255),
+    },
+}
+
+
+def default_preset():
+    from django.conf import settings
+    return getattr(settings, 'RENDER_OUTPUT_PRESET', 'png')
+
+
+def get_preset(name=None):
+    name = name or default_preset()
+    if name not in PRESETS:
+        raise ValueError(f"Unknown output preset {name!r}, expected one of {sorted(PRESETS)}")
+    return PRESETS[name]
+
+
+def prepare_for_format(image, preset):
+    """Downgrade RGBA to RGB for formats without alpha"""
+    if 'flatten_color' not in preset or image.mode != 'RGBA':
+        return image
+    # Opaque canvases (the usual case for white-background templates) just drop alpha
+    if image.getchannel('A').getextrema()[0] == 255:
+        return image.convert('RGB')
+    from PIL import Image
+    flat = Image.new('RGB', image.size, preset['flatten_color'])
+    flat.paste(image, (0, 0), image)
+    return flat
+
+
+def encode(image, output, preset_name=None):
+    """
+    Encode image to output (path or file object) with a preset.
+    Returns (format, extension, byte_size).
+    """
+    preset = get_preset(preset_name)
+    image = prepare_for_format(image, preset)
+    image.save(output, format=preset['format'], **preset['params'])
+    if isinstance(output, (str, os.PathLike)):
+        byte_size = os.path.getsize(output)
+    else:
+        byte_size = output.tell()
+    return preset['format'], preset['extension'], byte_size
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_encoder_pool():
+    """
+    Threads for encoding. Pillow releases the GIL inside its encoders, so an
+    encode overlaps with compositing the next template in the calling thread.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from django.conf import settings
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RENDER_ENCODE_THREADS', 2),
+                thread_name_prefix='encode',
+            )
+    return _executor
+
+
+def encode_async(image, output, preset_name=None, timer=None):
+    """
+    Encode in the pool; returns a Future of (format, extension, byte_size).
+    The encode's own duration (without queueing) is recorded on timer as 'encode'.
+    """
+    func = timer.timed('encode', encode) if timer else encode
+    return get_encoder_pool().submit(func, image, output, preset_name)
@@ -1,81 +1,211 @@
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import cv2
-import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
 from io import BytesIO
 from rembg import remove
+import threading
 import os
 
+from .cache import get_asset_cache
+from .encoding import encode, encode_async
+from .memory import get_buffer_pool
+from .text import default_font_path, text_blocks
+from .transform import QUALITIES, placement_matrix, warp_layer
+
+
+# Bump whenever a change to the engine alters rendered pixels, so render
+# fingerprints (and cached base plates) from older versions stop matching
+ENGINE_VERSION = 2
+
+
+class RembgSessionManager:
+    """
+    Holds one rembg/ONNX Runtime session per worker process.
+    Building a session loads the U2Net weights and initialises ORT, which takes
+    seconds; reusing it makes every job after the first pay only for inference.
+    """
+
+    def __init__(self, model_name='u2net', intra_op_threads=1, inter_op_threads=1, providers=None):
+        self.model_name = model_name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.providers = providers
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def fork_safe(self):
+        # ORT thread pools don't survive fork(); a single-threaded session does
+        return self.intra_op_threads == 1 and self.inter_op_threads == 1
+
+    def get(self):
+        """Return this process's session, creating it on first use"""
+        if self._session is not None and (self._pid == os.getpid() or self.fork_safe):
+            return self._session
+        with self._lock:
+            if self._session is None or (self._pid != os.getpid() and not self.fork_safe):
+                self._session = self._create()
+                self._pid = os.getpid()
+        return self._session
+
+    def preload(self, warm=True):
+        """
+        Build the session now, e.g. in the Celery parent before it forks so
+        children share the model weights copy-on-write.
+        """
+        session = self.get()
+        if warm:
+            # The first inference allocates ORT's buffers; get it out of the way here
+            session.predict(Image.new('RGB', (64, 64)))
+        return session
+
+    def _create(self):
+        import onnxruntime as ort
+        from rembg.sessions import sessions_class
+        from rembg.sessions.u2net import U2netSession
+
+        session_class = next(
+            (sc for sc in sessions_class if sc.name() == self.model_name), U2netSession
+        )
+        sess_opts = ort.SessionOptions()
+        if self.intra_op_threads:
+            sess_opts.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            sess_opts.inter_op_num_threads = self.inter_op_threads
+        return session_class(self.model_name, sess_opts, self.providers)
+
+
+_session_manager = None
+
+def get_session_manager():
+    """Process-wide session manager, configured from Django settings"""
+    global _session_manager
+    if _session_manager is None:
+        from django.conf import settings
+        _session_manager = RembgSessionManager(
+            model_name=getattr(settings, 'REMBG_MODEL', 'u2net'),
+            intra_op_threads=getattr(settings, 'REMBG_INTRA_OP_THREADS', 1),
+            inter_op_threads=getattr(settings, 'REMBG_INTER_OP_THREADS', 1),
+        )
+    return _session_manager
+
+
+def default_resample_quality():
+    """Resampling tier for product placement: 'area' (default), 'linear' or 'lanczos'"""
+    from django.conf import settings
+    return getattr(settings, 'RENDER_RESAMPLE_QUALITY', 'area')
+
+
 class ImageGenerator:
-    def __init__(self, canvas_size=(2000, 2000)):
+    def __init__(self, canvas_size=(2000, 2000), session_manager=None, asset_cache=None,
+                 buffer_pool=None, resample_quality=None):
         self.canvas_size = canvas_size
         self.default_font_size = 60
+        self._session_manager = session_manager
+        self.asset_cache = asset_cache or get_asset_cache()
+        self.buffer_pool = buffer_pool or get_buffer_pool()
+        self.resample_quality = resample_quality or default_resample_quality()
+        if self.resample_quality not in QUALITIES:
+            raise ValueError(f"Unknown resample quality {self.resample_quality!r}, expected one of {QUALITIES}")
+
+    @property
+    def session_manager(self):
+        if self._session_manager is None:
+            self._session_manager = get_session_manager()
+        return self._session_manager
     
     def remove_background(self, image_file_obj):
+        """Cut out the foreground of an image file object, or of an already decoded image"""
+        if isinstance(image_file_obj, Image.Image):
+            # rembg takes PIL images directly and returns one: no encode/decode round trip
+            return remove(image_file_obj, session=self.session_manager.get())
         image_file_obj.seek(0)
         input_data = image_file_obj.read()
-        output_data = remove(input_data)
+        output_data = remove(input_data, session=self.session_manager.get())
         image = Image.open(BytesIO(output_data))
         return image
     
     def create_canvas(self, background_color=(255, 255, 255), background_image=None):
-        if background_image and os.path.exists(background_image):
-            bg = Image.open(background_image)
-            bg = bg.resize(self.canvas_size, Image.Resampling.LANCZOS)
-            canvas = bg.convert('RGBA')
+        bg = self.asset_cache.get(background_image, size=self.canvas_size) if background_image else None
+        if bg is not None:
+            # Cached images are shared, draw on a copy
+            canvas = bg.copy()
         else:
-            canvas = Image.new('RGBA', self.canvas_size, background_color + (255,))
+            canvas = Image.new('RGBA', self.canvas_size, tuple(background_color[:3]) + (255,))
         return canvas
-    
-    def place_product(self, canvas, product_image, position, scale=1.0, rotate=0):
-        if product_image.mode != 'RGBA':
-            product_image = product_image.convert('RGBA')
-        
-        if scale != 1.0:
-            new_size = tuple(int(dim * scale) for dim in product_image.size)
-            product_image = product_image.resize(new_size, Image.Resampling.LANCZOS)
-        
-        if rotate != 0:
-            product_image = product_image.rotate(rotate, expand=True, resample=Image.Resampling.BICUBIC)
-        
-        x, y = position
-        x = int(x - product_image.width / 2)
-        y = int(y - product_image.height / 2)
-        
-        canvas.paste(product_image, (x, y), product_image)
+
+    def start_canvas(self, base):
+        """
+        Working canvas for one render, initialised from a shared base image.
+        The canvas memory comes from the buffer pool; save_image and
+        save_image_async give it back, so don't use the canvas after saving it.
+        """
+        canvas = self.buffer_pool.image(base.mode, base.size)
+        canvas.paste(base, (0, 0))
+        return canvas
+
+    def _paste(self, canvas, layer, position):
+        canvas.paste(layer, position, layer)
         return canvas
+    
+    def place_product(self, canvas, product_image, position, scale=1.0, rotate=0, quality=None):
+        """
+        Scale and rotate the product about its centre and place that centre at
+        position, in a single resample (see generation.transform). quality
+        overrides the generator's resample_quality for this placement.
+        """
+        matrix = placement_matrix(product_image.size, position, scale, rotate)
+        placed = warp_layer(
+            product_image, matrix, canvas.size, quality or self.resample_quality
+        )
+        if placed is None:
+            return canvas
+        layer, origin = placed
+        return self._paste(canvas, layer, origin)
+
+    def load_overlay(self, image_path, scale=1.0):
+        """Load an overlay image as RGBA, scaled. Returns None if the file is missing.
+        The image comes from the shared asset cache and must not be drawn on."""
+        overlay = self.asset_cache.get(image_path, scale=scale)
+        if overlay is None:
+            print(f"Warning: Overlay not found at {image_path}")
+        return overlay
 
     def add_overlay(self, canvas, image_path, position, scale=1.0):
         """Add an overlay image (like batteries or banners)"""
-        if not os.path.exists(image_path):
-            print(f"Warning: Overlay not found at {image_path}")
+        overlay = self.load_overlay(image_path, scale)
+        if overlay is None:
             return canvas
             
-        overlay = Image.open(image_path)
-        if overlay.mode != 'RGBA':
-            overlay = overlay.convert('RGBA')
-            
-        if scale != 1.0:
-            new_size = tuple(int(dim * scale) for dim in overlay.size)
-            overlay = overlay.resize(new_size, Image.Resampling.LANCZOS)
-            
         # Position is center-based? Let's make it top-left based for overlays to be easier
         # Or keep consistent: Position is the TOP-LEFT corner of the overlay
-        canvas.paste(overlay, position, overlay)
+        return self._paste(canvas, overlay, position)
+
+    def composite(self, canvas, layer, position=(0, 0)):
+        """Alpha-composite an RGBA layer onto canvas, clipping it to the canvas bounds"""
+        x, y = int(position[0]), int(position[1])
+        left, top = max(0, -x), max(0, -y)
+        right = min(layer.width, canvas.width - x)
+        bottom = min(layer.height, canvas.height - y)
+        if right <= left or bottom <= top:
+            return canvas
+        canvas.alpha_composite(layer, (x + left, y + top), (left, top, right, bottom))
         return canvas
     
     def add_text(self, canvas, text, position, font_path=None, font_size=None, 
                  color=(0, 0, 0, 255), align='left', max_width=None):
-        draw = ImageDraw.Draw(canvas)
-        
-        # Try loading a better font, fallback to default
-        font = ImageFont.load_default()
-        # You can add a font file to assets/fonts/ and load it here for better look
-        
-        if max_width:
-            text = self._wrap_text(text, font, max_width)
-        
-        draw.text(position, text, fill=color, font=font, align=align)
-        return canvas
+        """
+        Draw text at position. With align='center' or 'right', position is the
+        centre or right edge of the text block; max_width wraps at word boundaries.
+        """
+        block, (dx, dy) = text_blocks.get(
+            text,
+            font_path or default_font_path(),
+            font_size or self.default_font_size,
+            color,
+            align,
+            max_width,
+        )
+        return self.composite(canvas, block, (position[0] + dx, position[1] + dy))
     
     def add_logo(self, canvas, logo_path, position, scale=0.2):
         return self.add_overlay(canvas, logo_path, position, scale)
@@ -86,16 +216,24 @@ class ImageGenerator:
         return canvas
     
     def add_dimension_lines(self, canvas, bbox, dimensions_text):
-        draw = ImageDraw.Draw(canvas)
         x1, y1, x2, y2 = bbox
         
         # Draw lines logic (kept simple for brevity)
+        draw = ImageDraw.Draw(canvas)
         draw.rectangle(bbox, outline=(0,0,0,255), width=3)
         return canvas
     
-    def _wrap_text(self, text, font, max_width):
-        return text # Simplified for now
-    
-    def save_image(self, canvas, output_path, format='PNG'):
-        canvas.save(output_path, format=format, quality=95)
-        return output_path
\ No newline at end of file
+    def save_image(self, canvas, output_path, preset=None):
+        """Encode with an output preset (see generation.encoding.PRESETS)"""
+        try:
+            encode(canvas, output_path, preset)
+        finally:
+            self.buffer_pool.release(canvas)
+        return output_path
+
+    def save_image_async(self, canvas, output, preset=None, timer=None):
+        """Encode in the encoder pool; returns a Future of (format, extension, byte_size)"""
+        future = encode_async(canvas, output, preset, timer)
+        # The canvas is free for the next render once the encoder is done with it
+        future.add_done_callback(lambda _: self.buffer_pool.release(canvas))
+        return future
\ No newline at end of file
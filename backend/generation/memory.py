@@ -0,0 +1,143 @@
+"""
+Memory management for renders: reusable pixel buffers and a per-process
+budget that admits renders while their estimated footprint fits.
+"""
+from PIL import Image
+import threading
+
+
+class BufferPool:
+    """
+    Free lists of canvas-sized images, by mode and size.
+
+    Every render needs a canvas the size of its output (16 MB for a 2000x2000
+    RGBA image). Freed blocks that large go back to the allocator in pieces
+    and rarely to the OS, so allocating them per render makes RSS creep up
+    unpredictably. Released buffers are kept here, up to max_bytes, and
+    handed to the next render of the same size. Their contents are
+    undefined: callers overwrite them.
+    """
+
+    def __init__(self, max_bytes=96 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.retained_bytes = 0
+        self._free = {}  # key -> [buffer]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discards = 0
+
+    def image(self, mode, size):
+        """A writable PIL image of this mode and size"""
+        image = self._take(('image', mode, tuple(size)))
+        return image if image is not None else Image.new(mode, tuple(size))
+
+    def release(self, *buffers):
+        """Give buffers back; nothing may use them afterwards"""
+        for buffer in buffers:
+            key, nbytes = self._describe(buffer)
+            with self._lock:
+                if self.retained_bytes + nbytes > self.max_bytes:
+                    self.discards += 1
+                    continue
+                self._free.setdefault(key, []).append(buffer)
+                self.retained_bytes += nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'discards': self.discards,
+                'retained_bytes': self.retained_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self.retained_bytes = 0
+
+    def _take(self, key):
+        with self._lock:
+            free = self._free.get(key)
+            if not free:
+                self.misses += 1
+                return None
+            buffer = free.pop()
+            self.retained_bytes -= self._describe(buffer)[1]
+            self.hits += 1
+            return buffer
+
+    @staticmethod
+    def _describe(buffer):
+        nbytes = len(buffer.getbands()) * buffer.width * buffer.height
+        return ('image', buffer.mode, buffer.size), nbytes
+
+
+class MemoryBudget:
+    """
+    Admits work while the estimated bytes of everything admitted fit in
+    max_bytes (0: no limit). Work larger than the whole budget is admitted
+    when nothing else is running, so it waits but never deadlocks.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def fits(self, nbytes):
+        return not self.max_bytes or not self.in_use or self.in_use + nbytes <= self.max_bytes
+
+    def acquire(self, nbytes, blocking=True):
+        """Reserve nbytes; without blocking, returns False instead of waiting for room"""
+        with self._condition:
+            if not self.fits(nbytes):
+                if not blocking:
+                    return False
+                self._condition.wait_for(lambda: self.fits(nbytes))
+            self.in_use += nbytes
+            return True
+
+    def release(self, nbytes):
+        if not nbytes:
+            return
+        with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+
+def estimate_render_bytes(canvas_size):
+    """
+    Upper bound on the transient memory of one render, on top of the caches:
+    the canvas, the scaled and rotated product layer (at most canvas-sized,
+    twice) and the encoder's working set and output (about one canvas).
+    """
+    pixels = canvas_size[0] * canvas_size[1]
+    return pixels * 4 + pixels * 4 * 2 + pixels * 4
+
+
+_buffer_pool = None
+_memory_budget = None
+_lock = threading.Lock()
+
+def get_buffer_pool():
+    """Process-wide buffer pool, sized from Django settings"""
+    global _buffer_pool
+    with _lock:
+        if _buffer_pool is None:
+            from django.conf import settings
+            max_mb = getattr(settings, 'RENDER_BUFFER_POOL_MB', 96)
+            _buffer_pool = BufferPool(max_bytes=max_mb * 1024 * 1024)
+    return _buffer_pool
+
+
+def get_memory_budget():
+    """Process-wide render memory budget, sized from Django settings"""
+    global _memory_budget
+    with _lock:
+        if _memory_budget is None:
+            from django.conf import settings
+            max_mb = getattr(settings, 'RENDER_MEMORY_BUDGET_MB', 0)
+            _memory_budget = MemoryBudget(max_bytes=max_mb * 1024 * 1024)
+    return _memory_budget
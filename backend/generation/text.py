@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+import threading
+import math
+import os
+
+# Shipped in the Docker image (fonts-dejavu); override with RENDER_FONT_PATH
+DEFAULT_FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+LINE_SPACING = 4
+
+
+def default_font_path():
+    from django.conf import settings
+    return getattr(settings, 'RENDER_FONT_PATH', DEFAULT_FONT_PATH)
+
+
+@lru_cache(maxsize=64)
+def get_font(font_path, size):
+    """
+    Load a TrueType font once per (path, size) per process.
+    Falls back to Pillow's built-in scalable font if the file is missing.
+    """
+    if font_path and os.path.exists(font_path):
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError as e:
+            print(f"Warning: Could not load font {font_path}: {e}")
+    else:
+        print(f"Warning: Font not found at {font_path}, using the built-in font")
+    return ImageFont.load_default(size)
+
+
+class TextLayout:
+    """Measures and wraps text for one font, caching glyph advances"""
+
+    def __init__(self, font):
+        self.font = font
+        self._advances = {}
+
+    def advance(self, char):
+        width = self._advances.get(char)
+        if width is None:
+            width = self._advances[char] = self.font.getlength(char)
+        return width
+
+    def measure(self, text):
+        # Sum of cached advances: ignores kerning, which is fine for line breaking
+        return sum(self.advance(char) for char in text)
+
+    def wrap(self, text, max_width):
+        """Greedy word wrap to max_width pixels; explicit newlines are kept"""
+        lines = []
+        space = self.advance(' ')
+        for paragraph in text.split('\n'):
+            line, line_width = [], 0.0
+            for word in paragraph.split(' '):
+                word_width = self.measure(word)
+                needed = word_width if not line else line_width + space + word_width
+                if line and needed > max_width:
+                    lines.append(' '.join(line))
+                    line, line_width = [word], word_width
+                else:
+                    line.append(word)
+                    line_width = needed
+            lines.append(' '.join(line))
+        return '\n'.join(lines)
+
+
+@lru_cache(maxsize=64)
+def get_layout(font_path, size):
+    return TextLayout(get_font(font_path, size))
+
+
+class TextBlockCache:
+    """
+    Memoizes rasterised text blocks by (text, font, size, color, align, max_width),
+    so identical headings aren't re-rasterised for every product.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font_path, size, color, align='left', max_width=None):
+        """Returns (RGBA image, (dx, dy)): the block and its offset from the draw position"""
+        key = (text, font_path, size, tuple(color), align, max_width)
+        with self._lock:
+            block = self._entries.get(key)
+            if block is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return block
+
+        block = render_text_block(text, font_path, size, tuple(color), align, max_width)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = block
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return block
+
+
+def render_text_block(text, font_path, size, color, align='left', max_width=None):
+    """Rasterise text onto a tightly cropped transparent layer"""
+    layout = get_layout(font_path, size)
+    if max_width:
+        text = layout.wrap(text, max_width)
+
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox(
+        (0, 0), text, font=layout.font, align=align, spacing=LINE_SPACING
+    )
+    # The bbox can be fractional; round outwards so no glyph pixels are cut off
+    bbox = (math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom))
+    width, height = max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])
+
+    if len(color) == 3:
+        color = color + (255,)
+    # Transparent pixels carry the text colour, so anti-aliased edges blend without a dark fringe
+    block = Image.new('RGBA', (width, height), color[:3] + (0,))
+    ImageDraw.Draw(block).multiline_text(
+        (-bbox[0], -bbox[1]), text, font=layout.font, fill=color, align=align, spacing=LINE_SPACING
+    )
+
+    # Horizontal anchor: position is the left edge, centre or right edge of the block
+    if align == 'center':
+        dx = -(width // 2)
+    elif align == 'right':
+        dx = -width
+    else:
+        dx = bbox[0]
+    return block, (dx, bbox[1])
+
+
+text_blocks = TextBlockCache()
@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+import functools
+import threading
+import time
+
+
+class StageTimer:
+    """
+    Accumulates wall time per named pipeline stage (seconds).
+    Thread-safe, so work handed to the encoder pool can record into it too.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def timed(self, name, func):
+        """Wrap func so each call is recorded under name, in whichever thread runs it"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def as_dict(self):
+        with self._lock:
+            return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+
+def merge_timings(*timings):
+    """Sum several {stage: seconds} dicts"""
+    total = {}
+    for stages in timings:
+        for name, seconds in (stages or {}).items():
+            total[name] = round(total.get(name, 0.0) + seconds, 4)
+    return total
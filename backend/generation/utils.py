@@ -1,4 +1,6 @@
 from django.conf import settings
+import hashlib
+import json
 import os
 
 def get_media_path(relative_path):
@@ -6,7 +8,12 @@ def get_media_path(relative_path):
     return os.path.join(settings.MEDIA_ROOT, relative_path)
 
 def get_logo_path():
-    """Get path to default logo"""
+    """Get path to default logo (cached per process, see products.registry)"""
+    from products.registry import registry
+    return registry.logo_path()
+
+def resolve_logo_path():
+    """Look up the default logo: database first, then the bundled asset"""
     from products.models import Logo
     
     # 1. Check Database for user-uploaded default logo
@@ -25,4 +32,37 @@ def replace_template_variables(text, context):
     """Replace template variables like {{product_name}}"""
     for key, value in context.items():
         text = text.replace(f"{{{{{key}}}}}", str(value))
-    return text
\ No newline at end of file
+    return text
+
+def file_signature(path):
+    """Cheap identity of a file on disk: (path, mtime, size), or None if missing"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [str(path), stat.st_mtime_ns, stat.st_size]
+
+def fingerprint(*parts):
+    """Stable SHA-256 over JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+_digests = {}
+
+def file_digest(path):
+    """SHA-256 of a file's contents, memoized per (path, mtime, size). None if missing"""
+    signature = file_signature(path)
+    if signature is None:
+        return None
+    key = tuple(signature)
+    digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = _digests[key] = sha.hexdigest()
+    return digest
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, ImageAsset, Template, GenerationJob, Logo
+from .models import Product, ImageAsset, ImageBlob, Template, BatchJob, GenerationJob, Logo
 
 
 @admin.register(Product)
@@ -30,6 +30,21 @@ class GenerationJobAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'completed_at']
 
 
+@admin.register(BatchJob)
+class BatchJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'total_jobs', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
+
+
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'format', 'byte_size', 'created_at', 'last_used_at']
+    list_filter = ['format']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'format', 'byte_size', 'created_at', 'last_used_at']
+
+
 @admin.register(Logo)
 class LogoAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_default', 'created_at']
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'products'
\ No newline at end of file
+    name = 'products'
+
+    def ready(self):
+        # Connect the configuration cache invalidation handlers
+        from . import signals  # noqa: F401
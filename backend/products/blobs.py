@@ -0,0 +1,91 @@
+from django.core.files.base import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+import hashlib
+
+from .models import ImageBlob
+from .uploads import get_upload_pool
+
+
+def blob_digest(buffer):
+    """SHA-256 of an in-memory file's contents"""
+    return hashlib.sha256(buffer.getbuffer()).hexdigest()
+
+
+def blob_name(digest, extension):
+    """
+    Storage name of a blob, under the file field's upload_to (blobs/); the
+    two-character prefix keeps directories small
+    """
+    return ImageBlob._meta.get_field('file').generate_filename(None, f"{digest[:2]}/{digest}.{extension}")
+
+
+def upload_blob(buffer, image_format, extension, timer=None):
+    """
+    Start storing the bytes in buffer (a BytesIO of encoded output) under their
+    hash. The file is written in the upload pool; returns a BlobUpload, whose
+    result() waits for it. Bytes that are already stored are not written again.
+    """
+    digest = blob_digest(buffer)
+    blob = ImageBlob.objects.filter(sha256=digest).first()
+    # Mark a reused blob as in use, so gc_blobs leaves it alone until our image
+    # references it. Updating nothing means gc_blobs deleted it since the lookup.
+    if blob is not None and not ImageBlob.objects.filter(pk=blob.pk).update(last_used_at=timezone.now()):
+        blob = None
+    if blob is None:
+        blob = ImageBlob(sha256=digest, format=image_format, byte_size=buffer.getbuffer().nbytes)
+        name = blob_name(digest, extension)
+    else:
+        name = blob.file.name
+    future = get_upload_pool().submit(
+        write_blob_file, blob.file.storage, name, buffer, blob.pk is not None, timer=timer
+    )
+    return BlobUpload(blob, future)
+
+
+def write_blob_file(storage, name, buffer, known):
+    """
+    Write buffer to storage as name and return the name it was saved under.
+    A known blob (one with a row) is only written if its file is missing;
+    returns None if it wasn't. Runs in an upload thread: storage only, no database.
+    """
+    if known:
+        if storage.exists(name):
+            return None
+        # The row survived but the file didn't; write it again under the same row
+        print(f"Warning: Blob {name} is missing from storage, rewriting it")
+    buffer.seek(0)
+    return storage.save(name, File(buffer))
+
+
+class BlobUpload:
+    """A blob whose file is being written in the upload pool"""
+
+    def __init__(self, blob, future):
+        self.blob = blob
+        self.future = future
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """
+        Wait for the write and return (blob, created). Concurrent writers of
+        the same bytes end up sharing one blob.
+        """
+        name = self.future.result()
+        blob = self.blob
+        if name is None:
+            return blob, False
+
+        blob.file.name = name
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # Another worker stored the same bytes first; use its blob
+            existing = ImageBlob.objects.get(sha256=blob.sha256)
+            if existing.file.name != name:
+                blob.file.storage.delete(name)
+            return existing, False
+        return blob, True
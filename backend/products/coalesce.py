@@ -0,0 +1,58 @@
+"""
+Coalescing of duplicate generation requests.
+
+A double-click or a frontend retry asks for the same product and templates
+again while the first job is still queued or running. Requests are keyed on
+the product, the template set and a fingerprint of their inputs (the source
+image, the product's last change and the template/logo config version), and
+a Redis lock around "look up, else create" makes the check hold across every
+web process: a duplicate gets the existing job back instead of a new one.
+
+Once that job finishes, or its inputs change, the next request starts a new
+one. Without Redis every request gets its own job, as before.
+"""
+from django.conf import settings
+import hashlib
+
+from redis.exceptions import LockError, RedisError
+
+from core.redis_client import get_redis
+from .models import GenerationJob
+from .registry import VERSION_KEY
+
+ACTIVE_STATUSES = ('pending', 'processing')
+
+
+def request_key(product, template_ids, config_version):
+    """Redis key shared by every request for the same job"""
+    digest = hashlib.sha256()
+    digest.update(f"{product.id}:{sorted(set(template_ids))}:{config_version}:".encode('utf-8'))
+    digest.update(f"{product.product_image.name}:{product.updated_at.isoformat()}".encode('utf-8'))
+    return f"generate:{digest.hexdigest()}"
+
+
+def get_or_create_job(product, template_ids, create):
+    """
+    Return (job, created): the job already queued or running for this request,
+    or the one create() makes (and dispatches) when there is none.
+    """
+    redis = get_redis()
+    job = existing = None
+    try:
+        key = request_key(product, template_ids, redis.get(VERSION_KEY) or '0')
+        with redis.lock(f"{key}:lock", timeout=settings.JOB_COALESCE_LOCK_TIMEOUT,
+                        blocking_timeout=settings.JOB_COALESCE_LOCK_TIMEOUT):
+            job_id = redis.get(key)
+            if job_id is not None:
+                existing = GenerationJob.objects.filter(id=job_id, status__in=ACTIVE_STATUSES).first()
+            if existing is None:
+                job = create()
+                redis.set(key, job.id, ex=settings.JOB_COALESCE_TTL)
+    except (LockError, RedisError) as e:
+        # Failing to release an expired lock is harmless; anything before that isn't
+        if job is None and existing is None:
+            print(f"Warning: Could not coalesce generation request, starting a new job: {e}")
+            job = create()
+    if existing is not None:
+        return existing, False
+    return job, True
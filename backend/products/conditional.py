@@ -0,0 +1,30 @@
+"""
+Conditional GET (ETag / Last-Modified) for API views.
+
+Validators are computed from cheap, indexed columns before anything is
+serialized, so a client that already has the current representation gets a
+304 without the serializer ever running.
+"""
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+import hashlib
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def conditional_response(request, etag, last_modified=None):
+    """A 304 response if the client's validators are current, else None"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Always revalidate: the representation changes whenever a job finishes
+    response['Cache-Control'] = 'no-cache'
+    return response
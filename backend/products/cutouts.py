@@ -0,0 +1,205 @@
+from django.core.files.base import ContentFile
+from io import BytesIO
+from PIL import Image, ImageOps
+import hashlib
+
+from .models import ImageAsset
+from generation.timing import StageTimer
+
+# Long edges of the working resolutions kept for each cutout. Uploads are
+# decoded at no more than the first; the others are stored as variants.
+PYRAMID_EDGES = (2048, 1024, 512)
+MAX_WORKING_EDGE = PYRAMID_EDGES[0]
+# ImageAsset kinds written by ingest; internal, not shown with the product's images
+CUTOUT_KINDS = ('cutout', 'cutout_variant')
+# Bump when ingest changes what a cutout looks like, to orphan old cutouts
+INGEST_VERSION = 1
+
+
+def cutout_key(source_bytes, model_name):
+    """Content address of a cutout: the source image bytes, the segmentation model and ingest settings"""
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}:ingest-{INGEST_VERSION}:{MAX_WORKING_EDGE}".encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(source_bytes)
+    return digest.hexdigest()
+
+
+def read_source(product):
+    """Raw bytes of the product's uploaded image"""
+    with product.product_image.open('rb') as f:
+        return f.read()
+
+
+def decode_source(source_bytes, max_edge=MAX_WORKING_EDGE):
+    """
+    Decode an upload at working resolution, upright. JPEGs are decoded with
+    draft(), which scales by 1/2, 1/4 or 1/8 inside the decoder, so a 6000px
+    photo never exists in memory at full size.
+    """
+    image = Image.open(BytesIO(source_bytes))
+    long_edge = max(image.size)
+    if long_edge > max_edge:
+        ratio = max_edge / long_edge
+        # draft() keeps the result at least this large; no-op for other formats
+        image.draft('RGB', (int(image.width * ratio), int(image.height * ratio)))
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return image
+
+
+def autocrop(cutout):
+    """Crop a cutout to the bounding box of its visible pixels"""
+    bbox = cutout.getchannel('A').getbbox()
+    if bbox is None or bbox == (0, 0) + cutout.size:
+        return cutout
+    return cutout.crop(bbox)
+
+
+def build_levels(cutout, edges=PYRAMID_EDGES[1:]):
+    """The cutout followed by downscaled copies at each smaller long edge"""
+    levels = [cutout]
+    for edge in edges:
+        if edge >= max(cutout.size):
+            continue
+        # Each level from the previous one: cheaper, and LANCZOS keeps it sharp
+        source = levels[-1]
+        ratio = edge / max(source.size)
+        size = (max(1, round(source.width * ratio)), max(1, round(source.height * ratio)))
+        levels.append(source.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0))
+    return levels
+
+
+class CutoutPyramid:
+    """
+    A cutout at several working resolutions. Level 0 is the reference: template
+    scales are relative to its size. Levels are loaded on first use.
+    """
+
+    def __init__(self, levels):
+        # [(size, image or loader)], largest first
+        self._levels = sorted(levels, key=lambda level: -max(level[0]))
+        self._images = {}
+
+    @classmethod
+    def from_image(cls, image, edges=PYRAMID_EDGES[1:]):
+        """Build every level in memory from a full-resolution cutout"""
+        return cls([(level.size, level) for level in build_levels(image, edges)])
+
+    @property
+    def size(self):
+        return self._levels[0][0]
+
+    @property
+    def sizes(self):
+        return [size for size, _ in self._levels]
+
+    def level(self, index):
+        image = self._images.get(index)
+        if image is None:
+            source = self._levels[index][1]
+            image = self._images[index] = source if isinstance(source, Image.Image) else source()
+        return image
+
+    def for_scale(self, scale):
+        """
+        (image, scale) for placing the cutout at scale relative to the reference:
+        the smallest level still at least as large as the target, and the scale
+        to apply to that level instead
+        """
+        target = max(self.size) * scale
+        index = 0
+        for i, (size, _) in enumerate(self._levels):
+            if max(size) >= target:
+                index = i
+        image = self.level(index)
+        return image, target / max(image.size)
+
+
+def load_asset_image(asset):
+    with asset.image.open('rb') as f:
+        image = Image.open(f)
+        image.load()
+    return image
+
+
+def find_cutout(key):
+    """Load a cached cutout pyramid by key, or None if we haven't computed it yet"""
+    assets = list(ImageAsset.objects.filter(kind__in=CUTOUT_KINDS, content_hash=key))
+    cutout = next((asset for asset in assets if asset.kind == 'cutout'), None)
+    if not cutout:
+        return None
+    try:
+        reference = load_asset_image(cutout)
+    except (OSError, ValueError) as e:
+        # The row survived but the file didn't; recompute
+        print(f"Warning: Cutout {key} is unreadable, recomputing: {e}")
+        return None
+    levels = [(reference.size, reference)]
+    for asset in assets:
+        if asset.kind == 'cutout_variant':
+            size = (asset.metadata['width'], asset.metadata['height'])
+            levels.append((size, lambda asset=asset: load_asset_image(asset)))
+    return CutoutPyramid(levels)
+
+
+def get_cutout(product, generator, timer=None):
+    """
+    Return (pyramid, key): the product's background-removed image at its
+    working resolutions (a CutoutPyramid), and its content address.
+    Background removal is the most expensive step of the pipeline, so the
+    result is stored as an ImageAsset(kind='cutout') and looked up by content
+    hash before rembg is ever called. Identical uploads share one cutout.
+    Ingest decodes the upload at working resolution, crops the cutout to its
+    visible pixels and stores smaller copies as ImageAsset(kind='cutout_variant').
+    Time spent decoding and in rembg is recorded on timer ('decode', 'rembg').
+    """
+    timer = timer or StageTimer()
+    source_bytes = read_source(product)
+    model_name = generator.session_manager.model_name
+    key = cutout_key(source_bytes, model_name)
+
+    pyramid = find_cutout(key)
+    if pyramid is not None:
+        return pyramid, key
+
+    with timer.stage('decode'):
+        source = decode_source(source_bytes)
+    with timer.stage('rembg'):
+        cutout = generator.remove_background(source)
+    if cutout.mode != 'RGBA':
+        cutout = cutout.convert('RGBA')
+    cutout = autocrop(cutout)
+
+    levels = build_levels(cutout)
+    for level in levels:
+        is_reference = level is cutout
+        buffer = BytesIO()
+        level.save(buffer, format='PNG')
+        asset = ImageAsset(
+            product=product,
+            name=f"{'Cutout' if is_reference else 'Cutout variant'} of {product.name}"[:255],
+            kind='cutout' if is_reference else 'cutout_variant',
+            content_hash=key,
+            metadata={
+                'model': model_name, 'width': level.width, 'height': level.height,
+                'source_width': source.width, 'source_height': source.height,
+            },
+        )
+        suffix = '' if is_reference else f"_{max(level.size)}"
+        asset.image.save(f"cutouts/{key}{suffix}.png", ContentFile(buffer.getvalue()))
+    return CutoutPyramid([(level.size, level) for level in levels]), key
+
+
+def load_cutout(product, generator, key=None, timer=None):
+    """
+    Like get_cutout, but with the key already known (computed by an earlier
+    task of the job) the cached pyramid is loaded directly, without reading
+    and hashing the source image again. Falls back to get_cutout if it's gone.
+    """
+    if key is not None:
+        pyramid = find_cutout(key)
+        if pyramid is not None:
+            return pyramid, key
+    return get_cutout(product, generator, timer)
@@ -0,0 +1,254 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw, ImageFilter
+from io import BytesIO
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import PIL
+
+from core.metrics import PeakRSS
+from generation.cache import BasePlateCache
+from generation.engine import ImageGenerator
+from generation.templates import TEMPLATES
+from generation.timing import StageTimer, merge_timings
+from generation.transform import QUALITIES
+from generation.utils import get_logo_path
+from products import tasks
+from products.cutouts import CutoutPyramid, autocrop
+from products.models import Template
+
+# Committed, recorded with --save-baseline and default options. Timings only compare
+# on similar hardware: a runner whose 'environment' differs (CPU count, library
+# versions, preset) should save its own baseline first and compare against that.
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'render_baseline.json')
+
+
+def synthetic_cutout(edge, seed=0):
+    """
+    A product cutout with the properties that matter for cost: a 3:4 frame
+    (long edge = edge), mostly transparent margins, soft edges and texture
+    """
+    rng = np.random.default_rng(seed)
+    width, height = edge * 3 // 4, edge
+    # Smooth shading with fine grain, like a photographed product (pure noise would
+    # make the encoder look far slower than on real catalog images)
+    shading = rng.integers(40, 220, size=(12, 9, 3), dtype=np.uint8)
+    image = Image.fromarray(shading, 'RGB').resize((width, height), Image.Resampling.BICUBIC)
+    grain = rng.integers(-6, 7, size=(height, width, 3), dtype=np.int16)
+    image = Image.fromarray(np.clip(np.asarray(image, dtype=np.int16) + grain, 0, 255).astype(np.uint8), 'RGB')
+    image = image.convert('RGBA')
+    mask = Image.new('L', (width, height), 0)
+    inset = edge // 16
+    ImageDraw.Draw(mask).rounded_rectangle(
+        (inset, inset, width - inset, height - inset), radius=edge // 8, fill=255
+    )
+    image.putalpha(mask.filter(ImageFilter.GaussianBlur(max(1, edge // 200))))
+    return image
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the full template pipeline (generate_single_image) on synthetic cutouts, '
+        'offline. Reports per-stage time, throughput and peak memory, and compares against '
+        'a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5, help='Timed renders per case')
+        parser.add_argument('--sizes', default='600,1200,2400',
+                            help='Comma-separated long edges of the synthetic cutouts, in pixels')
+        parser.add_argument('--templates', default='',
+                            help=f"Comma-separated TEMPLATES keys (default: all of {', '.join(TEMPLATES)})")
+        parser.add_argument('--resample', choices=QUALITIES,
+                            help='Product placement quality (default: RENDER_RESAMPLE_QUALITY)')
+        parser.add_argument('--preset', help='Output preset (default: per template / RENDER_OUTPUT_PRESET)')
+        parser.add_argument('--with-rembg', action='store_true',
+                            help='Also time background removal with the configured model '
+                                 '(REMBG_MODEL; must already be downloaded). Stubbed by default.')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON path')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--threshold', type=float, default=0.15,
+                            help='Allowed slowdown per case before the run fails (0.15 = 15%%)')
+        parser.add_argument('--output', help='Also write this run\'s JSON report here')
+
+    def handle(self, *args, **options):
+        keys = [key for key in options['templates'].split(',') if key] or list(TEMPLATES)
+        unknown = sorted(set(keys) - set(TEMPLATES))
+        if unknown:
+            raise CommandError(f"Unknown templates: {', '.join(unknown)}")
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        report = {'environment': self.environment(options), 'cases': {}}
+        logo_path = get_logo_path()
+        context = {'product_name': 'Benchmark Product'}
+
+        # A private plate cache in a scratch directory: the first render of each
+        # template is a cold build, the rest hit memory, as on a warm worker
+        saved_plate_cache = tasks.plate_cache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            tasks.plate_cache = BasePlateCache(max_entries=len(keys), cache_dir=cache_dir)
+            try:
+                for key in keys:
+                    spec = dict(TEMPLATES[key])
+                    if options['preset']:
+                        spec['output_preset'] = options['preset']
+                    # Unsaved: the pipeline only reads name, kind, spec and background_image
+                    template = Template(name=spec['name'], kind=spec['kind'], spec=spec)
+                    generator = ImageGenerator(
+                        canvas_size=tuple(spec.get('canvas_size', (2000, 2000))),
+                        resample_quality=options['resample'],
+                    )
+                    for size in sizes:
+                        case = self.run_case(
+                            generator, template, size, logo_path, context, options
+                        )
+                        report['cases'][f"{key}@{size}"] = case
+                        self.print_case(f"{key}@{size}", case)
+            finally:
+                tasks.plate_cache = saved_plate_cache
+
+        total_renders = sum(case['renders'] for case in report['cases'].values())
+        total_seconds = sum(case['seconds'] for case in report['cases'].values())
+        report['throughput'] = round(total_renders / total_seconds, 3) if total_seconds else 0.0
+        self.stdout.write(f"throughput: {report['throughput']:.2f} renders/s "
+                          f"({total_renders} renders, warm plates, one process)")
+
+        if options['output']:
+            self.write_json(options['output'], report)
+        if options['save_baseline']:
+            self.write_json(options['baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+        self.compare(report, options)
+
+    def run_case(self, generator, template, size, logo_path, context, options):
+        source = synthetic_cutout(size)
+        rembg_seconds = None
+        if options['with_rembg']:
+            encoded = BytesIO()
+            source.convert('RGB').save(encoded, format='PNG')
+            started = time.perf_counter()
+            cutout = autocrop(generator.remove_background(BytesIO(encoded.getvalue())).convert('RGBA'))
+            rembg_seconds = time.perf_counter() - started
+        else:
+            cutout = autocrop(source)
+        # Working resolutions, as ingest stores them
+        cutout = CutoutPyramid.from_image(cutout)
+
+        def render(timer):
+            output = BytesIO()
+            future = tasks.generate_single_image(
+                generator, template, cutout, logo_path, context, output, timer
+            )
+            return future.result()
+
+        # Untimed warm-up: builds the base plate, loads fonts and fills the asset cache
+        cold = StageTimer()
+        started = time.perf_counter()
+        render(cold)
+        cold_seconds = time.perf_counter() - started
+
+        stage_runs, samples = [], []
+        with PeakRSS() as memory:
+            for _ in range(options['iterations']):
+                timer = StageTimer()
+                started = time.perf_counter()
+                image_format, extension, byte_size = render(timer)
+                samples.append(time.perf_counter() - started)
+                stage_runs.append(timer.as_dict())
+
+        iterations = len(samples)
+        stages = {
+            stage: round(seconds / iterations * 1000, 2)
+            for stage, seconds in merge_timings(*stage_runs).items()
+        }
+        if rembg_seconds is not None:
+            stages['rembg'] = round(rembg_seconds * 1000, 2)
+        samples.sort()
+        return {
+            'renders': iterations,
+            'seconds': round(sum(samples), 4),
+            'ms_per_render': round(sum(samples) / iterations * 1000, 2),
+            'ms_median': round(samples[iterations // 2] * 1000, 2),
+            'ms_cold': round(cold_seconds * 1000, 2),
+            'stages_ms': stages,
+            'peak_rss_mb': round(memory.peak / 2 ** 20, 1),
+            'output': {'format': image_format, 'bytes': byte_size},
+        }
+
+    def print_case(self, name, case):
+        stages = ' '.join(f"{stage}={ms:.1f}" for stage, ms in case['stages_ms'].items())
+        self.stdout.write(
+            f"{name:<32} {case['ms_per_render']:8.1f} ms/render (median {case['ms_median']:.1f}, "
+            f"cold {case['ms_cold']:.1f})  peak RSS {case['peak_rss_mb']:.0f} MB\n    {stages}"
+        )
+
+    def environment(self, options):
+        return {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'resample': options['resample'] or settings.RENDER_RESAMPLE_QUALITY,
+            'preset': options['preset'] or settings.RENDER_OUTPUT_PRESET,
+            'iterations': options['iterations'],
+            'rembg': settings.REMBG_MODEL if options['with_rembg'] else 'stubbed',
+        }
+
+    def write_json(self, path, report):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def compare(self, report, options):
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {options['baseline']}; run with --save-baseline to create one"
+            ))
+            return
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+
+        if baseline.get('environment') != report['environment']:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was recorded in a different environment or configuration; '
+                'comparisons may not be meaningful'
+            ))
+
+        regressions = []
+        for name, case in report['cases'].items():
+            before = baseline.get('cases', {}).get(name)
+            if not before:
+                continue
+            change = case['ms_per_render'] / before['ms_per_render'] - 1
+            line = f"{name:<32} {before['ms_per_render']:8.1f} -> {case['ms_per_render']:8.1f} ms ({change:+.1%})"
+            if change > options['threshold']:
+                # Name the stages that got slower, to point at the culprit
+                slower = [
+                    f"{stage} {before['stages_ms'].get(stage, 0):.1f}->{ms:.1f}"
+                    for stage, ms in case['stages_ms'].items()
+                    if ms > before['stages_ms'].get(stage, 0) * (1 + options['threshold']) and ms >= 1
+                ]
+                regressions.append(f"{line}  [{', '.join(slower)}]")
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} case(s) slower than baseline by more than "
+                f"{options['threshold']:.0%}:\n" + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
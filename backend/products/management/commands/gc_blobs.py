@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from products.models import ImageBlob
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete image blobs that no GeneratedImage references any more, in bulk. '
+        'Blobs stored or reused within the grace period are kept: a render may '
+        'have stored one and not yet saved the row that points at it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Keep unreferenced blobs used less than this long ago')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Blobs deleted per query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        unreferenced = ImageBlob.objects.filter(images__isnull=True, last_used_at__lt=cutoff)
+
+        deleted = freed = 0
+        last_id = 0
+        while True:
+            # Keyset pagination, so deleting rows doesn't shift the window
+            chunk = list(
+                unreferenced.filter(id__gt=last_id).order_by('id').values_list('id', 'file', 'byte_size')
+                [:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            if options['dry_run']:
+                deleted += len(chunk)
+                freed += sum(byte_size for _, _, byte_size in chunk)
+                continue
+
+            # Rows first, re-checking under row locks: a render may have reused a blob
+            # since we listed it, and upload_blob's touch waits for the locks
+            ids = [blob_id for blob_id, _, _ in chunk]
+            try:
+                with transaction.atomic():
+                    locked = list(
+                        unreferenced.filter(id__in=ids).select_for_update(of=('self',))
+                        .values_list('id', flat=True)
+                    )
+                    ImageBlob.objects.filter(id__in=locked).delete()
+            except ProtectedError:
+                self.stdout.write(self.style.WARNING(
+                    f"Blobs {ids[0]}-{ids[-1]} gained references while collecting; skipped"
+                ))
+                continue
+            kept = set(ImageBlob.objects.filter(id__in=ids).values_list('id', flat=True))
+            storage = ImageBlob._meta.get_field('file').storage
+            for blob_id, name, byte_size in chunk:
+                if blob_id not in kept:
+                    storage.delete(name)
+                    deleted += 1
+                    freed += byte_size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} unreferenced blobs ({freed / 2 ** 20:.1f} MB)"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageasset',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imageasset',
+            name='metadata',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_imageasset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
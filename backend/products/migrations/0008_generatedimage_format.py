@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_batchjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedimage',
+            name='byte_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generatedimage',
+            name='format',
+            field=models.CharField(default='PNG', max_length=10),
+        ),
+    ]
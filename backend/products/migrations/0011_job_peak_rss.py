@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='peak_rss_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
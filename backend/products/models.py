@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
@@ -29,6 +30,9 @@ class ImageAsset(models.Model):
     name = models.CharField(max_length=255)
     image = models.ImageField(upload_to='assets/')
     kind = models.CharField(max_length=50)
+    # For derived assets (e.g. cutouts): hash of the inputs they were computed from
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    metadata = models.JSONField(default=dict, blank=True)
     # Added created_at to fix Admin error
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -50,6 +54,45 @@ class Logo(models.Model):
     def __str__(self):
         return self.name
 
+class BatchJob(models.Model):
+    """A catalog-wide (or filtered) generation run; one GenerationJob per product"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    # Either an explicit list of product IDs, or a filter (see get_products)
+    product_ids = models.JSONField(default=list, blank=True)
+    product_filter = models.JSONField(default=dict, blank=True)
+    templates_used = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_jobs = models.IntegerField(default=0)
+    error_message = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def get_products(self):
+        """Products this batch covers"""
+        products = Product.objects.all()
+        if self.product_ids:
+            return products.filter(id__in=self.product_ids)
+        filters = self.product_filter or {}
+        if filters.get('name'):
+            products = products.filter(name__icontains=filters['name'])
+        if filters.get('sku'):
+            products = products.filter(sku__istartswith=filters['sku'])
+        if filters.get('created_after'):
+            products = products.filter(created_at__gte=filters['created_after'])
+        if filters.get('created_before'):
+            products = products.filter(created_at__lt=filters['created_before'])
+        return products
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.status})"
+
 class GenerationJob(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -59,8 +102,15 @@ class GenerationJob(models.Model):
     ]
 
     product = models.ForeignKey(Product, related_name='jobs', on_delete=models.CASCADE)
+    batch = models.ForeignKey(BatchJob, related_name='jobs', on_delete=models.SET_NULL, null=True, blank=True)
     templates_used = models.JSONField(default=list)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Per-template outcomes, filled in when the job finishes
+    result = models.JSONField(null=True, blank=True)
+    # Seconds spent per pipeline stage, summed over the job's templates (see generation.timing)
+    timings = models.JSONField(default=dict, blank=True)
+    # Highest resident memory sampled in the worker processes that ran this job, in bytes
+    peak_rss_bytes = models.BigIntegerField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -69,11 +119,38 @@ class GenerationJob(models.Model):
     def __str__(self):
         return f"Job {self.id} - {self.product.name} ({self.status})"
 
+class ImageBlob(models.Model):
+    """
+    An encoded output file, stored once under its SHA-256 (see products.blobs).
+    Referenced by every GeneratedImage with these exact bytes; blobs nothing
+    references any more are removed by the gc_blobs command.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/')
+    format = models.CharField(max_length=10, default='PNG')
+    byte_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Last time a render stored (or reused) these bytes; gc_blobs keeps recently used blobs
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.format}, {self.byte_size} bytes)"
+
 class GeneratedImage(models.Model):
     product = models.ForeignKey(Product, related_name='generated_images', on_delete=models.CASCADE)
     template = models.ForeignKey(Template, on_delete=models.SET_NULL, null=True)
     job = models.ForeignKey(GenerationJob, related_name='generated_images', on_delete=models.CASCADE)
+    # Same file as blob.file; images rendered before blobs existed have their own file and no blob
     image = models.ImageField(upload_to='generated/')
+    blob = models.ForeignKey(ImageBlob, related_name='images', on_delete=models.PROTECT,
+                             null=True, blank=True)
+    # Encoded output: file format (PNG/WEBP/JPEG) and size in bytes
+    format = models.CharField(max_length=10, default='PNG')
+    byte_size = models.PositiveIntegerField(null=True, blank=True)
+    # Hash of every input of the render (see tasks.render_fingerprint); equal means identical output
+    fingerprint = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Seconds spent per pipeline stage for this render
+    timings = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -0,0 +1,98 @@
+"""
+Live job progress, published through Redis.
+
+Workers keep a small hash per job (status, total, one field per finished
+template, and a version counter) and publish every change on the job's
+channel. Each event carries the full snapshot, so a client never has to merge
+events and a late subscriber only needs the current hash to catch up.
+"""
+from django.conf import settings
+import json
+
+from redis.exceptions import RedisError
+
+from core.redis_client import get_redis
+
+TERMINAL_STATUSES = ('completed', 'failed')
+TEMPLATE_FIELD_PREFIX = 'template:'
+
+
+def progress_key(job_id):
+    return f"job:{job_id}:progress"
+
+
+def progress_channel(job_id):
+    return f"job:{job_id}:events"
+
+
+def parse_snapshot(job_id, fields):
+    """Build the client-facing progress snapshot from the raw hash fields"""
+    templates = {
+        name[len(TEMPLATE_FIELD_PREFIX):]: value
+        for name, value in fields.items() if name.startswith(TEMPLATE_FIELD_PREFIX)
+    }
+    statuses = list(templates.values())
+    return {
+        'job_id': int(job_id),
+        'status': fields.get('status', 'pending'),
+        'total': int(fields.get('total', 0)),
+        'done': len(templates),
+        'generated_count': statuses.count('completed'),
+        'skipped_count': statuses.count('skipped'),
+        'failed_count': statuses.count('failed'),
+        'templates': templates,
+        'version': int(fields.get('version', 0)),
+    }
+
+
+def snapshot_from_job(job):
+    """Progress snapshot from the database, for jobs with no (or an expired) Redis hash"""
+    templates = {
+        template_id: outcome['status']
+        for template_id, outcome in ((job.result or {}).get('templates') or {}).items()
+    }
+    fields = {
+        TEMPLATE_FIELD_PREFIX + template_id: status for template_id, status in templates.items()
+    }
+    fields.update(status=job.status, total=len(job.templates_used or []))
+    return parse_snapshot(job.id, fields)
+
+
+def publish(job_id, event, fields, extra=None):
+    """
+    Apply fields to the job's progress hash and notify subscribers.
+    Progress is best effort: a Redis outage must never fail a render.
+    """
+    key = progress_key(job_id)
+    try:
+        client = get_redis()
+        pipe = client.pipeline()
+        pipe.hset(key, mapping=fields)
+        pipe.hincrby(key, 'version', 1)
+        pipe.hgetall(key)
+        pipe.expire(key, settings.JOB_PROGRESS_TTL)
+        snapshot = parse_snapshot(job_id, pipe.execute()[2])
+        message = {'event': event, **snapshot, **(extra or {})}
+        client.publish(progress_channel(job_id), json.dumps(message))
+    except RedisError as e:
+        print(f"Warning: Could not publish progress for job {job_id}: {e}")
+
+
+def publish_status(job_id, status, total=None, error=None):
+    fields = {'status': status}
+    if total is not None:
+        fields['total'] = total
+    publish(job_id, 'status', fields, {'error': error} if error else None)
+
+
+def publish_template(job_id, result):
+    """One template finished: result is the render outcome stored in job.result"""
+    template = {
+        key: result[key] for key in ('template_id', 'status', 'image_id', 'error') if key in result
+    }
+    publish(
+        job_id,
+        'template',
+        {TEMPLATE_FIELD_PREFIX + str(result['template_id']): result['status']},
+        {'template': template},
+    )
@@ -0,0 +1,83 @@
+"""
+In-process cache of render configuration: the default logo and templates.
+
+Every process keeps its own copy and a version number. Saving or deleting a
+Logo or Template bumps a shared version counter in Redis (see signals.py);
+processes call sync() once per task or request, which costs one Redis GET and
+drops the local copy if the version moved. Without Redis the copy simply
+expires after CONFIG_CACHE_TTL seconds.
+"""
+from django.conf import settings
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from core.redis_client import get_redis
+
+VERSION_KEY = 'config:version'
+
+
+class ConfigRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._loaded_at = 0.0
+        self._entries = {}
+
+    def sync(self):
+        """Drop cached configuration if another process changed it since we loaded it"""
+        try:
+            version = get_redis().get(VERSION_KEY) or '0'
+        except RedisError:
+            version = None
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at > settings.CONFIG_CACHE_TTL
+            changed = version is not None and version != self._version
+            if changed or expired:
+                self._entries.clear()
+                self._version = version
+                self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Bump the shared version so every process reloads on its next sync()"""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+        try:
+            get_redis().incr(VERSION_KEY)
+        except RedisError as e:
+            print(f"Warning: Could not publish configuration change: {e}")
+
+    def _get(self, key, load):
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+        value = load()
+        with self._lock:
+            self._entries[key] = value
+        return value
+
+    def logo_path(self):
+        from generation.utils import resolve_logo_path
+        return self._get('logo_path', resolve_logo_path)
+
+    def _active_templates(self):
+        from .models import Template
+        return self._get('templates', lambda: {t.id: t for t in Template.objects.filter(is_active=True)})
+
+    def template(self, template_id):
+        """A Template by id; raises Template.DoesNotExist. Shared: treat as read-only"""
+        from .models import Template
+        templates = self._active_templates()
+        if template_id in templates:
+            return templates[template_id]
+        # Inactive templates can still be named by a job; cache them alongside
+        return self._get(('template', template_id), lambda: Template.objects.get(id=template_id))
+
+    def active_template_ids(self):
+        return sorted(self._active_templates())
+
+
+registry = ConfigRegistry()
@@ -0,0 +1,360 @@
+"""
+Render a job's templates in a local process pool.
+
+The job's cutout levels are copied once into shared memory, and so are base
+plates, which stay there across jobs alongside the plate cache. Pool processes
+map them as zero-copy NumPy views, wrapped in read-only PIL images, instead of
+receiving a pickled copy per template.
+Pool processes only composite and encode. They never load the rembg model,
+query the database or write to storage: the job's own process does that.
+
+Celery's default prefork pool doesn't allow it. billiard marks each pool
+child as a daemon, and the mark is visible to the standard library too:
+multiprocessing.current_process() in a task is a daemonic ForkPoolWorker.
+The stdlib refuses to start children from a daemonic process ("daemonic
+processes are not allowed to have children"), and ProcessPoolExecutor uses
+the stdlib. billiard's own Process doesn't apply that rule, but
+concurrent.futures has no billiard backend. Under --pool=threads or
+--pool=solo, tasks run in the worker's non-daemonic main process and the
+pool starts normally. Elsewhere enabled() is False and jobs render
+in-process. (Checked with Celery 5.3.4 and billiard 4.3.1: under prefork
+a task gets the AssertionError above from ProcessPoolExecutor and from
+multiprocessing.Process, with both spawn and fork contexts; under threads
+the same spawn pool runs.)
+"""
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from multiprocessing import shared_memory
+from PIL import Image
+from io import BytesIO
+import atexit
+import multiprocessing
+import threading
+
+import numpy as np
+
+from . import tasks
+from .cutouts import CutoutPyramid
+from generation.cache import BasePlate
+from generation.engine import ImageGenerator
+from generation.timing import StageTimer
+
+_executor = None
+_executor_lock = threading.Lock()
+# Set when the pool could not be started in this process, so we stop trying
+_unavailable = None
+
+
+def enabled():
+    """Whether this process renders jobs in the pool (RENDER_PROCESSES > 0 and it can have children)"""
+    return (
+        settings.RENDER_PROCESSES > 0
+        and _unavailable is None
+        and not multiprocessing.current_process().daemon
+    )
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def get_render_pool():
+    """
+    This process's render pool, started on first use and kept for every job after.
+    Spawned rather than forked: the parent has encoder threads and Redis and
+    database connections that must not be inherited mid-use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+    return _executor
+
+
+def reset_render_pool():
+    """Drop a broken pool (a process died, e.g. out of memory); the next job starts a new one"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def share_image(image):
+    """Copy an image into a new shared memory segment; returns (segment, ref)"""
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    segment = shared_memory.SharedMemory(create=True, size=image.width * image.height * 4)
+    view = np.ndarray((image.height, image.width, 4), dtype=np.uint8, buffer=segment.buf)
+    view[...] = np.asarray(image)
+    del view
+    return segment, (segment.name, image.width, image.height)
+
+
+def release(segments):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+class SharedFrames:
+    """
+    RGBA images copied into shared memory for the lifetime of one job.
+    add() returns a picklable reference (name, width, height) that
+    Attachment.image() turns back into an image in a pool process.
+    """
+
+    def __init__(self):
+        self._segments = []
+
+    def add(self, image):
+        segment, ref = share_image(image)
+        self._segments.append(segment)
+        return ref
+
+    def add_pyramid(self, pyramid):
+        return [self.add(pyramid.level(index)) for index in range(len(pyramid.sizes))]
+
+    def close(self):
+        release(self._segments)
+        self._segments.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedPlates:
+    """
+    Base plates in shared memory, kept across jobs like the plate cache they
+    mirror, so a warm worker shares each plate once rather than once per job.
+    Plates in use by a running job are pinned; trim() drops the least recently
+    used of the rest down to max_entries.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (ref, segments)
+        self._pins = Counter()
+        self._lock = threading.Lock()
+
+    def pin(self, key, plate):
+        """Reference (base, top, top_offset) to a shared copy of plate; unpin(key) when done"""
+        with self._lock:
+            self._pins[key] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+        segments = []
+        try:
+            base_segment, base_ref = share_image(plate.base)
+            segments.append(base_segment)
+            top_ref = None
+            if plate.top is not None:
+                top_segment, top_ref = share_image(plate.top)
+                segments.append(top_segment)
+        except Exception:
+            release(segments)
+            self.unpin(key)
+            raise
+        ref = (base_ref, top_ref, plate.top_offset)
+        with self._lock:
+            if key in self._entries:
+                # Another thread shared it first
+                release(segments)
+                return self._entries[key][0]
+            self._entries[key] = (ref, segments)
+        return ref
+
+    def unpin(self, key):
+        with self._lock:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+
+    def trim(self):
+        with self._lock:
+            unpinned = [key for key in self._entries if key not in self._pins]
+            excess = len(self._entries) - self.max_entries
+            dropped = [self._entries.pop(key)[1] for key in unpinned[:max(0, excess)]]
+        for segments in dropped:
+            release(segments)
+
+    def clear(self):
+        with self._lock:
+            dropped = [segments for _, segments in self._entries.values()]
+            self._entries.clear()
+        for segments in dropped:
+            release(segments)
+
+
+_shared_plates = None
+
+
+def get_shared_plates():
+    global _shared_plates
+    with _executor_lock:
+        if _shared_plates is None:
+            _shared_plates = SharedPlates(max_entries=settings.RENDER_PLATE_CACHE_SIZE)
+            # Segments outlive their mappings; unlink them when the worker exits
+            atexit.register(_shared_plates.clear)
+    return _shared_plates
+
+
+class Attachment:
+    """Shared images mapped into this process; close() once every image made from them is gone"""
+
+    def __init__(self):
+        self._segments = []
+
+    def image(self, ref):
+        name, width, height = ref
+        segment = shared_memory.SharedMemory(name=name)
+        self._segments.append(segment)
+        view = np.ndarray((height, width, 4), dtype=np.uint8, buffer=segment.buf)
+        # frombuffer maps the array without copying; Pillow copies before any in-place edit
+        return Image.frombuffer('RGBA', (width, height), view, 'raw', 'RGBA', 0, 1)
+
+    def close(self):
+        for segment in self._segments:
+            try:
+                segment.close()
+            except BufferError:
+                # An image still points into the segment; the mapping goes with the process
+                print(f"Warning: Shared frame {segment.name} still in use")
+        self._segments.clear()
+
+
+def render_shared(spec, canvas_size, resample_quality, preset, plate_ref, cutout_refs, context):
+    """
+    Pool side of a render: composite one template from shared frames and encode it.
+    Returns (format, extension, encoded bytes, {stage: seconds}).
+    """
+    timer = StageTimer()
+    generator = ImageGenerator(
+        canvas_size=tuple(canvas_size), resample_quality=resample_quality
+    )
+    attachment = Attachment()
+    try:
+        canvas = _compose_shared(attachment, generator, spec, plate_ref, cutout_refs, context, timer)
+    finally:
+        attachment.close()
+    buffer = BytesIO()
+    image_format, extension, _ = generator.save_image_async(canvas, buffer, preset, timer).result()
+    return image_format, extension, buffer.getvalue(), timer.as_dict()
+
+
+def _compose_shared(attachment, generator, spec, plate_ref, cutout_refs, context, timer):
+    # Every image mapped from shared memory is local to this frame, so none outlive the attachment
+    base_ref, top_ref, top_offset = plate_ref
+    plate = BasePlate(
+        attachment.image(base_ref),
+        attachment.image(top_ref) if top_ref else None,
+        tuple(top_offset),
+    )
+    pyramid = CutoutPyramid([(tuple(ref[1:]), attachment.image(ref)) for ref in cutout_refs])
+    return tasks.compose_image(generator, spec, plate, pyramid, context, timer)
+
+
+class PooledRender:
+    """An in-flight pool render; result() writes the encoded image to output like the encoder pool does"""
+
+    def __init__(self, future, output, timer):
+        self.future = future
+        self.output = output
+        self.timer = timer
+
+    def result(self):
+        try:
+            image_format, extension, data, timings = self.future.result()
+        except BrokenProcessPool:
+            reset_render_pool()
+            raise
+        self.output.write(data)
+        for stage, seconds in timings.items():
+            self.timer.add(stage, seconds)
+        return image_format, extension, len(data)
+
+
+class JobRenderer:
+    """
+    Hands one job's renders to the pool. Takes the place of generate_single_image
+    in start_render: base plates are looked up (or built) here and shared, the
+    pool does the rest. close() releases the job's shared frames.
+    """
+
+    def __init__(self, product_cutout):
+        self.frames = SharedFrames()
+        self.plates = get_shared_plates()
+        self.pinned = []
+        self.cutout_refs = self.frames.add_pyramid(product_cutout)
+
+    def __call__(self, generator, template, product_cutout, logo_path, context, output, timer):
+        global _unavailable
+        with timer.stage('plate'):
+            key = tasks.base_plate_key(template, generator, logo_path)
+            plate = tasks.plate_cache.get_or_build(
+                key, lambda: tasks.build_base_plate(generator, template, logo_path, timer)
+            )
+            plate_ref = self.plates.pin(key, plate)
+            self.pinned.append(key)
+        try:
+            future = get_render_pool().submit(
+                render_shared,
+                template.spec,
+                generator.canvas_size,
+                generator.resample_quality,
+                tasks.get_output_preset(template),
+                plate_ref,
+                self.cutout_refs,
+                context,
+            )
+        except (BrokenProcessPool, AssertionError, OSError) as e:
+            # The pool can't start here; render this and every later job in-process
+            print(f"Warning: Render pool unavailable, rendering in-process: {e}")
+            _unavailable = e
+            reset_render_pool()
+            return tasks.generate_single_image(
+                generator, template, product_cutout, logo_path, context, output, timer
+            )
+        return PooledRender(future, output, timer)
+
+    def close(self):
+        self.frames.close()
+        for key in self.pinned:
+            self.plates.unpin(key)
+        self.pinned.clear()
+        self.plates.trim()
+
+
+def render_templates(job, template_ids, generator, product_cutout, cutout_key, logo_path):
+    """
+    Render a job's templates in the pool. Everything is submitted before the
+    first result is stored, so the pool stays busy while this process hands
+    finished images to the upload pool and records them.
+    """
+    renderer = JobRenderer(product_cutout)
+    try:
+        renders = [
+            tasks.start_render(
+                job, template_id, generator, product_cutout, cutout_key, logo_path,
+                renderer=renderer,
+            )
+            for template_id in template_ids
+        ]
+        for render in renders:
+            tasks.upload_render(render)
+        return [tasks.finish_render(job, render) for render in renders]
+    finally:
+        # Only once every render has finished: pool processes map these until then
+        renderer.close()
@@ -1,6 +1,27 @@
 
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, ImageAsset, Template, GenerationJob, Logo
+from .models import Product, ImageAsset, Template, BatchJob, GenerationJob, GeneratedImage, Logo
+from .registry import registry
+
+
+def absolute_url(context, file):
+    """
+    Absolute URL of a stored file. The site root is resolved once per
+    serializer context rather than with build_absolute_uri per file.
+    """
+    request = context.get('request')
+    if not file or not request:
+        return None
+    url = file.url
+    if '://' in url:
+        # Remote storage (S3) already returns absolute URLs
+        return url
+    if '_site_root' not in context:
+        context['_site_root'] = request.build_absolute_uri('/').rstrip('/')
+    return context['_site_root'] + url
 
 
 class ImageAssetSerializer(serializers.ModelSerializer):
@@ -11,18 +32,46 @@ class ImageAssetSerializer(serializers.ModelSerializer):
         fields = ['id', 'kind', 'image', 'url', 'metadata', 'created_at']
     
     def get_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+        return absolute_url(self.context, obj.image)
+
+
+class GeneratedImageSerializer(serializers.ModelSerializer):
+    # Generated images are shown alongside assets; their kind is the template's
+    kind = serializers.CharField(source='template.kind', default='generated', read_only=True)
+    template_name = serializers.CharField(source='template.name', default=None, read_only=True)
+    url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = GeneratedImage
+        fields = ['id', 'kind', 'template', 'template_name', 'url', 'format', 'byte_size', 'created_at']
+    
+    def get_url(self, obj):
+        return absolute_url(self.context, obj.image)
+
+
+class ProductListSerializer(serializers.ModelSerializer):
+    """Catalog listing: no nested images, just what a product card needs"""
+    thumbnail_url = serializers.SerializerMethodField()
+    # Annotated by ProductViewSet.get_queryset for list requests
+    image_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'sku', 'thumbnail_url', 'image_count', 'created_at', 'updated_at']
+    
+    def get_thumbnail_url(self, obj):
+        return absolute_url(self.context, obj.product_image)
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    images = ImageAssetSerializer(many=True, read_only=True)
+    # Uploaded assets (cutouts are internal and left out, see ProductViewSet.get_queryset)
+    images = ImageAssetSerializer(source='visible_assets', many=True, read_only=True)
+    generated_images = GeneratedImageSerializer(many=True, read_only=True)
     
     class Meta:
         model = Product
-        fields = ['id', 'name', 'sku', 'description', 'images', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'sku', 'description', 'images', 'generated_images',
+                  'created_at', 'updated_at']
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
@@ -33,13 +82,19 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         fields = ['name', 'sku', 'description', 'original_image']
     
     def create(self, validated_data):
+        # Local import to prevent circular dependency (same as views.generate_images)
+        from .tasks import prepare_cutout
+
         original_image = validated_data.pop('original_image')
-        product = Product.objects.create(**validated_data)
+        product = Product.objects.create(product_image=original_image, **validated_data)
         ImageAsset.objects.create(
             product=product,
+            name=original_image.name,
             kind='original',
             image=original_image
         )
+        # Warm the cutout cache so the first generation job skips background removal
+        transaction.on_commit(lambda: prepare_cutout.delay(product.id))
         return product
 
 
@@ -52,10 +107,7 @@ class TemplateSerializer(serializers.ModelSerializer):
                   'background_url', 'preview_image', 'is_active', 'created_at']
     
     def get_background_url(self, obj):
-        request = self.context.get('request')
-        if obj.background_image and request:
-            return request.build_absolute_uri(obj.background_image.url)
-        return None
+        return absolute_url(self.context, obj.background_image)
 
 
 class GenerationJobSerializer(serializers.ModelSerializer):
@@ -64,8 +116,76 @@ class GenerationJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = GenerationJob
         fields = ['id', 'product', 'product_name', 'status', 'templates_used', 
-                  'result', 'error_message', 'created_at', 'completed_at']
-        read_only_fields = ['status', 'result', 'error_message', 'completed_at']
+                  'result', 'timings', 'peak_rss_bytes', 'error_message', 'created_at', 'completed_at']
+        read_only_fields = ['status', 'result', 'timings', 'peak_rss_bytes', 'error_message',
+                            'completed_at']
+
+
+class BatchJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BatchJob
+        fields = ['id', 'status', 'product_ids', 'product_filter', 'templates_used',
+                  'total_jobs', 'progress', 'error_message', 'created_at',
+                  'started_at', 'completed_at']
+        read_only_fields = fields
+    
+    def get_progress(self, obj):
+        # Counts are annotated by BatchJobViewSet (views.with_progress); query for them otherwise
+        if hasattr(obj, 'images_generated'):
+            counts = {state: getattr(obj, f"{state}_count") for state, _ in BatchJob.STATUS_CHOICES}
+            images = obj.images_generated
+        else:
+            counts = obj.jobs.aggregate(**{
+                state: Count('id', filter=Q(status=state)) for state, _ in BatchJob.STATUS_CHOICES
+            })
+            images = GeneratedImage.objects.filter(job__batch=obj).count()
+        done = counts['completed'] + counts['failed']
+        
+        progress = dict(counts, done=done, images_generated=images,
+                        percent=round(100 * done / obj.total_jobs, 1) if obj.total_jobs else 0.0,
+                        jobs_per_minute=None, images_per_minute=None, eta_seconds=None)
+        if obj.started_at:
+            elapsed = ((obj.completed_at or timezone.now()) - obj.started_at).total_seconds()
+            if elapsed > 0:
+                progress['jobs_per_minute'] = round(done * 60 / elapsed, 2)
+                progress['images_per_minute'] = round(images * 60 / elapsed, 2)
+                if done and not obj.completed_at:
+                    progress['eta_seconds'] = round((obj.total_jobs - done) * elapsed / done)
+        return progress
+
+
+class BatchJobCreateSerializer(serializers.ModelSerializer):
+    product_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    product_filter = serializers.DictField(required=False)
+    template_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    
+    class Meta:
+        model = BatchJob
+        fields = ['id', 'product_ids', 'product_filter', 'template_ids']
+    
+    def validate_product_filter(self, value):
+        allowed = {'name', 'sku', 'created_after', 'created_before'}
+        unknown = set(value) - allowed
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unsupported filter keys: {', '.join(sorted(unknown))}"
+            )
+        return value
+    
+    def create(self, validated_data):
+        # Local import to prevent circular dependency (same as views.generate_images)
+        from .tasks import enqueue_batch
+
+        template_ids = validated_data.pop('template_ids', None)
+        # If no templates specified, use all active templates
+        if not template_ids:
+            registry.sync()
+            template_ids = registry.active_template_ids()
+        batch = BatchJob.objects.create(templates_used=template_ids, **validated_data)
+        transaction.on_commit(lambda: enqueue_batch.delay(batch.id))
+        return batch
 
 
 class LogoSerializer(serializers.ModelSerializer):
@@ -76,7 +196,4 @@ class LogoSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image', 'url', 'is_default', 'created_at']
     
     def get_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
\ No newline at end of file
+        return absolute_url(self.context, obj.image)
\ No newline at end of file
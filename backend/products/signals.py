@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Logo, Template
+from .registry import registry
+
+
+@receiver(post_save, sender=Logo)
+@receiver(post_delete, sender=Logo)
+@receiver(post_save, sender=Template)
+@receiver(post_delete, sender=Template)
+def invalidate_render_config(sender, **kwargs):
+    """Logos and templates feed every render: tell all processes to reload them"""
+    # After commit, so no process reloads the old rows in between
+    transaction.on_commit(registry.invalidate)
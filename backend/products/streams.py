@@ -0,0 +1,179 @@
+"""
+ASGI endpoints for live job progress, mounted in core.asgi ahead of Django:
+
+    GET /api/products/jobs/<id>/events/               server-sent events
+    GET /api/products/jobs/<id>/wait/?version=N       long-poll
+
+Both hold a connection on one event loop instead of a gunicorn worker per
+poll. They only touch the database when Redis has no progress for the job.
+"""
+from asgiref.sync import sync_to_async
+from urllib.parse import parse_qs
+import asyncio
+import json
+import re
+
+from redis.exceptions import RedisError
+
+from core.redis_client import get_async_redis
+from .progress import TERMINAL_STATUSES, parse_snapshot, progress_channel, progress_key, snapshot_from_job
+
+ROUTE = re.compile(r'^/api/products/jobs/(?P<job_id>\d+)/(?P<kind>events|wait)/?$')
+
+# SSE comment sent while idle, so proxies don't drop the connection
+KEEPALIVE_SECONDS = 15
+LONG_POLL_TIMEOUT = 25
+MAX_LONG_POLL_TIMEOUT = 60
+
+
+def match(path):
+    """(job_id, kind) if the path is a progress endpoint, else None"""
+    found = ROUTE.match(path)
+    return (int(found['job_id']), found['kind']) if found else None
+
+
+@sync_to_async
+def snapshot_from_db(job_id):
+    from .models import GenerationJob
+    job = GenerationJob.objects.filter(id=job_id).first()
+    return snapshot_from_job(job) if job else None
+
+
+async def get_snapshot(client, job_id):
+    fields = await client.hgetall(progress_key(job_id))
+    if fields:
+        return parse_snapshot(job_id, fields)
+    return await snapshot_from_db(job_id)
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', b'no-store'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def job_events(scope, receive, send, job_id):
+    """Stream the job's snapshot, then every change, until the job finishes"""
+    client = get_async_redis()
+    pubsub = client.pubsub()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    started = False
+    try:
+        # Subscribe before reading the snapshot so no event falls in between
+        await pubsub.subscribe(progress_channel(job_id))
+        snapshot = await get_snapshot(client, job_id)
+        if snapshot is None:
+            await send_json(send, 404, {'error': 'Job not found'})
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Tell nginx not to buffer the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        started = True
+
+        async def emit(event, data):
+            chunk = f"event: {event}\nid: {data['version']}\ndata: {json.dumps(data)}\n\n"
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+
+        await emit('snapshot', snapshot)
+        version = snapshot['version']
+        status = snapshot['status']
+        while status not in TERMINAL_STATUSES and not disconnected.done():
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS)
+            if message is None:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            data = json.loads(message['data'])
+            # Events published before our snapshot was read are already included in it
+            if data['version'] <= version:
+                continue
+            version, status = data['version'], data['status']
+            await emit(data.pop('event'), data)
+
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    except RedisError as e:
+        print(f"Warning: Progress stream for job {job_id} lost Redis: {e}")
+        if not started:
+            await send_json(send, 503, {'error': 'Progress stream unavailable'})
+        elif not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        # Closing the connection drops the subscription server-side
+        await pubsub.aclose()
+
+
+async def job_wait(scope, receive, send, job_id):
+    """
+    Long-poll: answer as soon as the job's version is newer than ?version=,
+    or it has finished, or after ?timeout= seconds with the unchanged snapshot.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        known = int(query.get('version', ['0'])[0])
+        timeout = min(float(query.get('timeout', [LONG_POLL_TIMEOUT])[0]), MAX_LONG_POLL_TIMEOUT)
+    except ValueError:
+        await send_json(send, 400, {'error': 'version and timeout must be numbers'})
+        return
+
+    client = get_async_redis()
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(progress_channel(job_id))
+        snapshot = await get_snapshot(client, job_id)
+        if snapshot is None:
+            await send_json(send, 404, {'error': 'Job not found'})
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while snapshot['version'] <= known and snapshot['status'] not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                data = json.loads(message['data'])
+                data.pop('event')
+                if data['version'] > snapshot['version']:
+                    snapshot = data
+        await send_json(send, 200, snapshot)
+    except RedisError as e:
+        print(f"Warning: Long-poll for job {job_id} lost Redis: {e}")
+        snapshot = await snapshot_from_db(job_id)
+        await send_json(send, 200 if snapshot else 404, snapshot or {'error': 'Job not found'})
+    finally:
+        await pubsub.aclose()
+
+
+async def progress_app(scope, receive, send, job_id, kind):
+    if scope['method'] not in ('GET', 'HEAD'):
+        await send_json(send, 405, {'error': 'Method not allowed'})
+        return
+    if kind == 'events':
+        await job_events(scope, receive, send, job_id)
+    else:
+        await job_wait(scope, receive, send, job_id)
@@ -1,152 +1,743 @@
-from celery import shared_task
-from django.core.files.base import ContentFile
+from celery import chord, group, shared_task
 from django.utils import timezone
 from django.conf import settings
+from PIL import Image
+from io import BytesIO
+import logging
 import os
-import tempfile
+import time
 
 # Ensure models are imported correctly
-from .models import Product, ImageAsset, Template, GenerationJob, GeneratedImage
-from generation.engine import ImageGenerator
-from generation.utils import get_logo_path, replace_template_variables
+from .models import Product, ImageAsset, BatchJob, GenerationJob, GeneratedImage
+from .blobs import upload_blob
+from .cutouts import get_cutout, load_cutout
+from . import progress, render_pool
+from .registry import registry
+from core import metrics
+from generation.cache import AssetCache, BasePlate, BasePlateCache
+from generation.engine import ENGINE_VERSION, ImageGenerator
+from generation.memory import estimate_render_bytes, get_memory_budget
+from generation.text import default_font_path, text_blocks
+from generation.timing import StageTimer, merge_timings
+from generation.utils import (
+    get_logo_path, replace_template_variables, file_digest, file_signature, fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the way base plates are composited changes, to orphan old cache entries
+PLATE_VERSION = 2
+
+# One cache per worker process, shared by every job the process runs
+plate_cache = BasePlateCache(
+    max_entries=settings.RENDER_PLATE_CACHE_SIZE,
+    cache_dir=os.path.join(settings.RENDER_CACHE_DIR, 'plates'),
+    max_disk_bytes=settings.RENDER_PLATE_CACHE_DISK_MB * 1024 * 1024,
+)
+# Admits renders in this process while their estimated memory fits (RENDER_MEMORY_BUDGET_MB)
+memory_budget = get_memory_budget()
 
 @shared_task
 def generate_product_images(job_id):
     """
-    Main entry point for Celery. 
-    This function was likely missing or not visible due to circular imports.
+    Main entry point for Celery, on the job's segment queue.
+    Prepares the shared cutout (background removal, the CPU- and memory-heavy
+    part), then hands the job to render_job on its render queue.
     """
+    # Sampled while this task runs; render tasks report their own peaks
+    memory = metrics.PeakRSS(interval=0.01).start()
     try:
         job = GenerationJob.objects.get(id=job_id)
         job.status = 'processing'
         job.started_at = timezone.now()
         job.save()
+        progress.publish_status(job.id, 'processing', total=len(job.templates_used))
 
         product = job.product
-        # Assuming 'product_image' is the field name for the cutout
-        product_cutout = product.product_image.path 
         
         # Initialize Generator
         generator = ImageGenerator()
         
-        # Get Templates
-        templates = Template.objects.filter(id__in=job.templates_used)
+        # Background removal runs at most once per source image (cached by content hash),
+        # so the render tasks below get their cutout from the cache
+        timer = StageTimer()
+        with timer.stage('cutout'):
+            _, cutout_key = get_cutout(product, generator, timer)
+        job.timings = timer.as_dict()
+        job.peak_rss_bytes = memory.peak
+        job.save(update_fields=['timings', 'peak_rss_bytes'])
+        record_cutout_metrics(job.timings)
         
-        generated_count = 0
-        
-        for template in templates:
-            try:
-                # Prepare Context
-                logo_path = get_logo_path(product) # Custom util logic
-                context = {
-                    "product_name": product.name,
-                    # Add other context variables here
-                }
-
-                # Generate
-                temp_path = generate_single_image(
-                    generator, 
-                    template, 
-                    product_cutout, 
-                    logo_path, 
-                    context
-                )
+        if not job.templates_used:
+            return finalize_job([], job.id, memory.peak)
 
-                # Save to DB
-                with open(temp_path, 'rb') as f:
-                    gen_img = GeneratedImage(
-                        product=product,
-                        template=template,
-                        job=job
-                    )
-                    filename = f"gen_{product.id}_{template.id}_{timezone.now().timestamp()}.png"
-                    gen_img.image.save(filename, ContentFile(f.read()))
-                    gen_img.save()
-                
-                # Cleanup temp file
-                os.remove(temp_path)
-                generated_count += 1
-
-            except Exception as e:
-                print(f"Error generating template {template.id}: {str(e)}")
-                # Optionally log specific template error but continue others
+        render_job.apply_async((job.id, cutout_key), queue=job_queue(job, 'render'))
+        return f"Cutout ready, rendering {len(job.templates_used)} templates"
 
-        job.status = 'completed'
-        job.completed_at = timezone.now()
-        job.save()
-        return f"Generated {generated_count} images"
+    except Exception as e:
+        if 'job' in locals():
+            fail_job(job, e)
+        raise e
+    finally:
+        memory.stop()
+
+
+@shared_task
+def render_job(job_id, cutout_key=None):
+    """
+    Render a job's templates, on the job's render queue. The cutout comes from
+    the cache generate_product_images filled (by cutout_key), so this never
+    runs the model. Templates fan out into one render_template subtask each,
+    collected by finalize_job (a chord); only the cutout key travels with
+    them. With RENDER_PROCESSES set, they are rendered in this worker's local
+    process pool instead (see render_pool); with RENDER_FANOUT off, they are
+    rendered here, one after another.
+    """
+    memory = metrics.PeakRSS(interval=0.01).start()
+    try:
+        # Logo and templates come from the per-process registry: one Redis GET, no queries
+        registry.sync()
+        job = GenerationJob.objects.select_related('product').get(id=job_id)
+        template_ids = list(job.templates_used)
+        use_pool = render_pool.enabled() and len(template_ids) > 1
+
+        if settings.RENDER_FANOUT and not use_pool:
+            # Each subtask loads the cutout itself; nothing to load here
+            queue = job_queue(job, 'render')
+            header = group(
+                render_template.s(job.id, template_id, cutout_key).set(queue=queue)
+                for template_id in template_ids
+            )
+            chord(header)(finalize_job.s(job.id).set(queue=queue))
+            return f"Dispatched {len(template_ids)} templates"
+
+        generator = ImageGenerator()
+        timer = StageTimer()
+        with timer.stage('cutout'):
+            product_cutout, cutout_key = load_cutout(job.product, generator, cutout_key, timer)
+        job.timings = merge_timings(job.timings, timer.as_dict())
+        job.save(update_fields=['timings'])
+
+        # The logo is the same for every template, resolve it once per job
+        logo_path = get_logo_path()
+        if use_pool:
+            # Every core of this node on one job, with the cutout and plates shared, not copied
+            results = render_pool.render_templates(
+                job, template_ids, generator, product_cutout, cutout_key, logo_path
+            )
+        else:
+            results = render_templates_for_job(
+                job, template_ids, generator, product_cutout, cutout_key, logo_path
+            )
+        return finalize_job(results, job.id, memory.peak)
 
     except Exception as e:
         if 'job' in locals():
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.save()
+            fail_job(job, e)
         raise e
+    finally:
+        memory.stop()
+
+
+def job_queue(job, stage):
+    """Celery queue for a stage ('segment' or 'render') of a job; batch jobs take the bulk lane"""
+    return settings.RENDER_QUEUES['bulk' if job.batch_id else 'interactive'][stage]
+
+
+def fail_job(job, error):
+    """Mark a job failed after an unexpected error and tell whoever is watching"""
+    job.status = 'failed'
+    job.error_message = str(error)
+    job.completed_at = timezone.now()
+    job.save()
+    progress.publish_status(job.id, 'failed', error=job.error_message)
+    if job.batch_id:
+        update_batch_status(job.batch_id)
 
-def generate_single_image(generator, template, product_cutout, logo_path, context):
+
+@shared_task
+def render_template(job_id, template_id, cutout_key=None):
     """
-    Helper function to generate one image.
+    Render one template of a job, from the cached cutout with key cutout_key.
+    Never raises: failures are reported in the result.
     """
-    spec = template.spec
-    
-    # 1. Determine Background Path
-    bg_image_path = None
-    
+    timer = StageTimer()
+    registry.sync()
+    with metrics.PeakRSS(interval=0.01) as memory:
+        try:
+            job = GenerationJob.objects.select_related('product').get(id=job_id)
+            generator = ImageGenerator()
+            with timer.stage('cutout'):
+                product_cutout, cutout_key = load_cutout(job.product, generator, cutout_key, timer)
+        except Exception as e:
+            return {'template_id': template_id, 'status': 'failed', 'error': str(e)}
+        result = render_template_for_job(
+            job, template_id, generator, product_cutout, cutout_key, get_logo_path(), timer
+        )
+    result['peak_rss_bytes'] = memory.peak
+    return result
+
+
+@shared_task
+def finalize_job(results, job_id, peak_rss=None):
+    """
+    Chord callback: record per-template outcomes and close the job.
+    peak_rss is the peak memory of the process that rendered the job in-process.
+    """
+    job = GenerationJob.objects.get(id=job_id)
+    generated = [r for r in results if r['status'] == 'completed']
+    skipped = [r for r in results if r['status'] == 'skipped']
+    failed = [r for r in results if r['status'] == 'failed']
+
+    # Sum the per-template asset cache counters into one figure for the job
+    asset_stats = {}
+    for r in results:
+        for key, value in r.get('asset_cache', {}).items():
+            if key != 'hit_rate':
+                asset_stats[key] = round(asset_stats.get(key, 0) + value, 4)
+    lookups = asset_stats.get('hits', 0) + asset_stats.get('misses', 0)
+    asset_stats['hit_rate'] = round(asset_stats.get('hits', 0) / lookups, 3) if lookups else 0.0
+
+    peaks = [job.peak_rss_bytes, peak_rss, *(r.get('peak_rss_bytes') for r in results)]
+    job.peak_rss_bytes = max((peak for peak in peaks if peak), default=None)
+
+    job.completed_at = timezone.now()
+    job.timings = merge_timings(job.timings, *(r.get('timings') for r in results))
+    if job.started_at:
+        job.timings['total'] = round((job.completed_at - job.started_at).total_seconds(), 4)
+        metrics.observe('job_duration_seconds', job.timings['total'])
+    job.result = {
+        'generated_count': len(generated),
+        'skipped_count': len(skipped),
+        'failed_count': len(failed),
+        'templates': {str(r['template_id']): r for r in results},
+        'asset_cache': asset_stats,
+    }
+    if results and not generated and not skipped:
+        job.status = 'failed'
+        job.error_message = '; '.join(f"Template {r['template_id']}: {r['error']}" for r in failed)
+    else:
+        job.status = 'completed'
+    job.save()
+    progress.publish_status(job.id, job.status, error=job.error_message or None)
+    if job.batch_id:
+        update_batch_status(job.batch_id)
+    return f"Generated {len(generated)} images"
+
+
+@shared_task
+def enqueue_batch(batch_id):
+    """
+    Create and dispatch one GenerationJob per product of a batch.
+    Work is enqueued chunk by chunk, so a 50k-product batch never holds every
+    row or message in memory at once.
+    """
+    batch = BatchJob.objects.get(id=batch_id)
+    batch.status = 'processing'
+    batch.started_at = timezone.now()
+    batch.save()
+
+    try:
+        product_ids = batch.get_products().order_by('id').values_list('id', flat=True)
+        # Set the expected total up front: jobs of early chunks may finish before
+        # the last chunk is enqueued, and the batch must not close on them
+        batch.total_jobs = product_ids.count()
+        batch.save(update_fields=['total_jobs'])
+
+        chunk_size = settings.BATCH_CHUNK_SIZE
+        total = 0
+        last_id = 0
+        while True:
+            # Keyset pagination over ids: cheap no matter how deep into the catalog we are
+            chunk = list(product_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            jobs = GenerationJob.objects.bulk_create([
+                GenerationJob(
+                    product_id=product_id,
+                    batch=batch,
+                    templates_used=batch.templates_used,
+                    status='pending'
+                )
+                for product_id in chunk
+            ])
+            queue = settings.RENDER_QUEUES['bulk']['segment']
+            group(generate_product_images.s(job.id).set(queue=queue) for job in jobs).apply_async()
+            total += len(jobs)
+    except Exception as e:
+        BatchJob.objects.filter(id=batch.id).update(status='failed', error_message=str(e))
+        raise
+
+    # The catalog may have changed while we were enqueueing; record what was actually sent
+    BatchJob.objects.filter(id=batch.id).update(total_jobs=total)
+    update_batch_status(batch.id)
+    return f"Enqueued {total} jobs"
+
+
+def update_batch_status(batch_id):
+    """Close a batch once none of its jobs are pending or processing"""
+    batch = BatchJob.objects.get(id=batch_id)
+    open_jobs = batch.jobs.filter(status__in=['pending', 'processing']).exists()
+    if open_jobs or batch.jobs.count() < batch.total_jobs:
+        return
+    failed = batch.jobs.filter(status='failed').count()
+    status = 'failed' if batch.total_jobs and failed == batch.total_jobs else 'completed'
+    # Only the first job to notice closes the batch
+    BatchJob.objects.filter(id=batch_id, completed_at__isnull=True).update(
+        status=status, completed_at=timezone.now()
+    )
+
+
+def render_template_for_job(job, template_id, generator, product_cutout, cutout_key, logo_path,
+                            timer=None):
+    """Render and store one template's image; returns a JSON-serialisable outcome"""
+    timer = timer or StageTimer()
+    reserved = reserve_render_memory(generator, timer)
+    return finish_render(job, start_render(
+        job, template_id, generator, product_cutout, cutout_key, logo_path, timer, reserved=reserved
+    ))
+
+
+def render_templates_for_job(job, template_ids, generator, product_cutout, cutout_key, logo_path):
+    """
+    Render several templates in this process, pipelined: while template N is
+    being encoded in the encoder pool, template N+1 is composited here, and
+    finished images upload in the background while later templates render.
+    Renders overlap only as far as the memory budget has room for them.
+    """
+    results, in_flight = [], []  # in_flight: started but not yet finished, oldest first
+    for template_id in template_ids:
+        timer = StageTimer()
+        reserved = reserve_render_memory(generator, timer, blocking=not in_flight)
+        while reserved is None:
+            # No room for another render: finish the oldest one in flight first
+            results.append(finish_render(job, in_flight.pop(0)))
+            reserved = reserve_render_memory(generator, timer, blocking=not in_flight)
+        started = start_render(
+            job, template_id, generator, product_cutout, cutout_key, logo_path, timer,
+            reserved=reserved,
+        )
+        if in_flight:
+            upload_render(in_flight[-1])
+        in_flight.append(started)
+        # Record whatever has finished uploading, in order
+        while len(in_flight) > 1 and render_stored(in_flight[0]):
+            results.append(finish_render(job, in_flight.pop(0)))
+    for render in in_flight:
+        upload_render(render)
+    results.extend(finish_render(job, render) for render in in_flight)
+    return results
+
+
+def start_render(job, template_id, generator, product_cutout, cutout_key, logo_path, timer=None,
+                 renderer=None, reserved=0):
+    """
+    Composite a template and hand it to the encoder pool. Returns an in-flight render.
+    Renders whose fingerprint already exists for the product are skipped.
+    Stage timings are collected on timer (a new StageTimer by default); the
+    template's own wall time runs from here to the end of finish_render.
+    renderer replaces generate_single_image, e.g. to render in the process pool.
+    reserved bytes of the memory budget are released when the render finishes.
+    """
+    product = job.product
+    asset_stats = generator.asset_cache.stats()
+    cache_stats = local_cache_stats()
+    render = {
+        'template_id': template_id, 'timer': timer or StageTimer(), 'reserved': reserved,
+        'started': time.perf_counter(),
+    }
+    try:
+        template = registry.template(template_id)
+
+        # Prepare Context
+        context = {
+            "product_name": product.name,
+            # Add other context variables here
+        }
+
+        with render['timer'].stage('lookup'):
+            render['fingerprint'] = render_fingerprint(
+                generator, template, cutout_key, logo_path, context
+            )
+            existing = GeneratedImage.objects.filter(
+                product=product, fingerprint=render['fingerprint']
+            ).first()
+        if existing:
+            render['skipped'] = existing.id
+            render['asset_cache'] = AssetCache.diff(asset_stats, generator.asset_cache.stats())
+            render['cache_lookups'] = cache_lookup_counts(cache_stats, render['asset_cache'])
+            return render
+
+        # Generate straight into memory; storage reads the buffer as a stream
+        render['template'] = template
+        render['buffer'] = BytesIO()
+        render['encoding'] = (renderer or generate_single_image)(
+            generator, 
+            template, 
+            product_cutout, 
+            logo_path, 
+            context,
+            render['buffer'],
+            render['timer']
+        )
+    except Exception as e:
+        render['error'] = e
+    render['asset_cache'] = AssetCache.diff(asset_stats, generator.asset_cache.stats())
+    render['cache_lookups'] = cache_lookup_counts(cache_stats, render['asset_cache'])
+    return render
+
+
+def upload_render(render):
+    """
+    Once a render's encode is done, hand its bytes to the upload pool, without
+    waiting for the upload. Does nothing for renders that were skipped or
+    failed, or whose upload has already started.
+    """
+    if 'buffer' not in render or 'upload' in render or 'error' in render:
+        return render
+    try:
+        render['encoded'] = render['encoding'].result()
+        image_format, extension, byte_size = render['encoded']
+        # Store the bytes once under their hash; finish_render points the row at them
+        render['upload'] = upload_blob(render['buffer'], image_format, extension, render['timer'])
+    except Exception as e:
+        render['error'] = e
+    return render
+
+
+def render_stored(render):
+    """Whether finish_render can record this render without waiting"""
+    if 'upload' in render:
+        return render['upload'].done()
+    return 'skipped' in render or 'error' in render
+
+
+def finish_render(job, render):
+    """Wait for a render's encode and upload, record it, and return its outcome"""
+    product = job.product
+    template_id = render['template_id']
+    timer = render['timer']
+    if 'skipped' in render:
+        memory_budget.release(render.pop('reserved'))
+        result = {
+            'template_id': template_id, 'status': 'skipped', 'image_id': render['skipped'],
+            'asset_cache': render['asset_cache'], 'timings': timer.as_dict(),
+        }
+        record_render_metrics(result, render['cache_lookups'])
+        progress.publish_template(job.id, result)
+        return result
+    try:
+        upload_render(render)
+        if 'error' in render:
+            raise render['error']
+        template = render['template']
+        image_format, extension, byte_size = render['encoded']
+
+        with timer.stage('upload_wait'):
+            blob, created = render['upload'].result()
+        render['cache_lookups']['blob'] = (0, 1) if created else (1, 0)
+        gen_img = GeneratedImage(
+            product=product,
+            template=template,
+            job=job,
+            image=blob.file.name,
+            blob=blob,
+            format=image_format,
+            byte_size=byte_size,
+            fingerprint=render['fingerprint']
+        )
+        gen_img.timings = timer.as_dict()
+        gen_img.save()
+        
+        result = {'template_id': template_id, 'status': 'completed', 'image_id': gen_img.id}
+
+    except Exception as e:
+        logger.exception("Error generating template %s for job %s", template_id, job.id)
+        result = {'template_id': template_id, 'status': 'failed', 'error': str(e)}
+
+    finally:
+        # Release the encoded bytes as soon as storage has them
+        if 'buffer' in render:
+            render.pop('buffer').close()
+        memory_budget.release(render.pop('reserved'))
+
+    result['asset_cache'] = render['asset_cache']
+    result['timings'] = timer.as_dict()
+    record_render_metrics(result, render['cache_lookups'], time.perf_counter() - render['started'])
+    progress.publish_template(job.id, result)
+    return result
+
+
+def reserve_render_memory(generator, timer, blocking=True):
+    """
+    Reserve one render's estimated footprint in this process's memory budget.
+    Returns the bytes reserved, or None if they don't fit now and blocking is
+    False. Time spent waiting for room is recorded on timer as 'memory_wait'.
+    """
+    nbytes = estimate_render_bytes(generator.canvas_size)
+    if memory_budget.acquire(nbytes, blocking=False):
+        return nbytes
+    if not blocking:
+        return None
+    with timer.stage('memory_wait'):
+        memory_budget.acquire(nbytes)
+    return nbytes
+
+
+def local_cache_stats():
+    """Counters of this process's plate and text caches, to diff around a render"""
+    return {
+        'plate': (plate_cache.hits + plate_cache.disk_hits, plate_cache.misses),
+        'text': (text_blocks.hits, text_blocks.misses),
+    }
+
+
+def cache_lookup_counts(before, asset_diff):
+    """{cache: (hits, misses)} for one render, including the asset cache diff"""
+    after = local_cache_stats()
+    counts = {
+        name: (after[name][0] - before[name][0], after[name][1] - before[name][1])
+        for name in after
+    }
+    counts['asset'] = (asset_diff['hits'], asset_diff['misses'])
+    return counts
+
+
+def record_render_metrics(result, cache_lookups, seconds=None):
+    """
+    Export one template's stage timings and cache lookups to /metrics/, and
+    its wall time (seconds, measured around the whole render) if completed.
+    Stages nest and overlap (encode and storage run in other threads), so
+    they don't add up to it.
+    """
+    timings = result['timings']
+    observations = [
+        ('render_stage_seconds', seconds, {'stage': stage}) for stage, seconds in timings.items()
+    ]
+    if result['status'] == 'completed' and seconds is not None:
+        observations.append(('render_template_seconds', seconds, None))
+    counters = [('render_templates_total', 1, {'status': result['status']})]
+    for cache, (hits, misses) in cache_lookups.items():
+        counters.append(('render_cache_lookups_total', hits, {'cache': cache, 'result': 'hit'}))
+        counters.append(('render_cache_lookups_total', misses, {'cache': cache, 'result': 'miss'}))
+    metrics.record(observations, counters)
+
+
+def record_cutout_metrics(timings):
+    """Export a job's cutout timing; a 'rembg' stage means the cutout cache missed"""
+    missed = 'rembg' in timings
+    metrics.record(
+        [('render_stage_seconds', seconds, {'stage': stage}) for stage, seconds in timings.items()],
+        [('render_cache_lookups_total', 1, {'cache': 'cutout', 'result': 'miss' if missed else 'hit'})],
+    )
+
+
+@shared_task
+def prepare_cutout(product_id):
+    """Compute (or find) a product's cutout ahead of time, right after upload"""
+    product = Product.objects.get(id=product_id)
+    if not product.product_image:
+        return "No product image"
+    get_cutout(product, ImageGenerator())
+    return f"Cutout ready for product {product_id}"
+
+
+def get_background_path(template):
+    """Resolve the background image for a template, if it has one"""
     # Priority A: Database Upload
     if template.background_image:
-        bg_image_path = template.background_image.path
+        return template.background_image.path
     # Priority B: Asset Folder (Specified in templates.py)
-    elif spec.get('background_asset'):
-        bg_image_path = os.path.join(settings.BASE_DIR, 'assets', spec['background_asset'])
+    if template.spec.get('background_asset'):
+        return os.path.join(settings.BASE_DIR, 'assets', template.spec['background_asset'])
+    return None
+
+
+def is_dynamic_text(text_spec):
+    """Text containing template variables changes per product and can't be baked in"""
+    return '{{' in text_spec.get('content', '')
+
+
+def base_plate_key(template, generator, logo_path):
+    """Fingerprint of everything that goes into a template's base plate"""
+    spec = template.spec
+    overlays = [
+        file_signature(os.path.join(settings.BASE_DIR, 'assets', overlay['path']))
+        for overlay in spec.get('overlays', [])
+    ]
+    return fingerprint(
+        PLATE_VERSION,
+        ENGINE_VERSION,
+        generator.canvas_size,
+        spec,
+        file_signature(get_background_path(template)),
+        overlays,
+        file_signature(logo_path) if spec.get('logo') else None,
+    )
+
+
+def render_fingerprint(generator, template, cutout_key, logo_path, context):
+    """
+    Deterministic identity of a render: the spec, content hashes of every
+    input file, the text context and everything about the engine that
+    affects output. Two renders with the same fingerprint are identical.
+    """
+    spec = template.spec
+    overlays = [
+        file_digest(os.path.join(settings.BASE_DIR, 'assets', overlay['path']))
+        for overlay in spec.get('overlays', [])
+    ]
+    fonts = sorted({
+        file_digest(text_font_path(text_spec) or default_font_path()) or ''
+        for text_spec in spec.get('text', [])
+    })
+    return fingerprint(
+        ENGINE_VERSION,
+        generator.canvas_size,
+        generator.resample_quality,
+        get_output_preset(template),
+        spec,
+        cutout_key,
+        file_digest(get_background_path(template)),
+        overlays,
+        file_digest(logo_path) if spec.get('logo') else None,
+        fonts,
+        context,
+    )
+
+
+def build_base_plate(generator, template, logo_path, timer=None):
+    """
+    Composite the static layers of a template: background and overlays go
+    below the product, static text and the logo go above it.
+    """
+    spec = template.spec
+    timer = timer or StageTimer()
     
-    # Create Canvas
+    # 1. Background
     bg_color = tuple(spec.get('background_color', [255, 255, 255]))
-    canvas = generator.create_canvas(bg_color, bg_image_path)
+    with timer.stage('background'):
+        base = generator.create_canvas(bg_color, get_background_path(template))
     
-    # 2. Add Overlays
-    if spec.get('overlays'):
-        for overlay in spec['overlays']:
+    # 2. Overlays
+    with timer.stage('overlays'):
+        for overlay in spec.get('overlays', []):
             ov_path = os.path.join(settings.BASE_DIR, 'assets', overlay['path'])
-            canvas = generator.add_overlay(
-                canvas, 
+            base = generator.add_overlay(
+                base, 
                 ov_path, 
                 tuple(overlay['position']), 
                 overlay.get('scale', 1.0)
             )
 
-    # 3. Place Product
-    prod_pos = spec.get('product_position', {})
-    canvas = generator.place_product(
-        canvas,
-        product_cutout,
-        position=(prod_pos.get('x', 1000), prod_pos.get('y', 1000)),
-        scale=prod_pos.get('scale', 1.0),
-        rotate=prod_pos.get('rotate', 0)
-    )
-    
-    # 4. Add Text
+    # 3. Static text + logo on a transparent layer above the product
+    top = Image.new('RGBA', generator.canvas_size, (0, 0, 0, 0))
     for text_spec in spec.get('text', []):
-        content = replace_template_variables(text_spec['content'], context)
-        canvas = generator.add_text(
-            canvas,
-            content,
-            position=tuple(text_spec['position']),
-            font_size=text_spec.get('font_size', 60),
-            color=tuple(text_spec.get('color', [0, 0, 0, 255]))
-        )
+        if not is_dynamic_text(text_spec):
+            top = add_text_from_spec(generator, top, text_spec, {})
     
-    # 5. Add Logo
     if logo_path and spec.get('logo'):
         logo_spec = spec['logo']
-        canvas = generator.add_logo(
-            canvas,
-            logo_path,
-            position=tuple(logo_spec['position']),
-            scale=logo_spec.get('scale', 0.2)
-        )
+        logo = generator.load_overlay(logo_path, logo_spec.get('scale', 0.2))
+        if logo is not None:
+            top = generator.composite(top, logo, tuple(logo_spec['position']))
     
+    # Only keep the part of the top layer that has content
+    bbox = top.getbbox()
+    if bbox is None:
+        return BasePlate(base)
+    return BasePlate(base, top.crop(bbox), bbox[:2])
+
+
+def text_font_path(text_spec):
+    """Optional per-text font, relative to the assets folder like overlays"""
+    if text_spec.get('font'):
+        return os.path.join(settings.BASE_DIR, 'assets', text_spec['font'])
+    return None
+
+
+def add_text_from_spec(generator, canvas, text_spec, context):
+    content = replace_template_variables(text_spec['content'], context)
+    return generator.add_text(
+        canvas,
+        content,
+        position=tuple(text_spec['position']),
+        font_path=text_font_path(text_spec),
+        font_size=text_spec.get('font_size', 60),
+        color=tuple(text_spec.get('color', [0, 0, 0, 255])),
+        align=text_spec.get('align', 'left'),
+        max_width=text_spec.get('max_width')
+    )
+
+
+def get_output_preset(template):
+    """Encoding preset: per template (spec 'output_preset'), else RENDER_OUTPUT_PRESET"""
+    return template.spec.get('output_preset') or settings.RENDER_OUTPUT_PRESET
+
+
+def generate_single_image(generator, template, product_cutout, logo_path, context, output,
+                          timer=None):
+    """
+    Helper function to generate one image into output (a path or file object).
+    product_cutout is a CutoutPyramid (see products.cutouts).
+    Static layers come from the cached base plate; only the product and
+    dynamic text are rendered per call. Encoding runs in the encoder pool:
+    returns a Future of (format, extension, byte_size).
+
+    Stages recorded on timer: plate (lookup; on a miss it includes the
+    background and overlays stages of the build), canvas, product, text,
+    logo (static text and logo above the product) and encode.
+    """
+    timer = timer or StageTimer()
+
+    # 1. Base plate (background, overlays, static text, logo)
+    with timer.stage('plate'):
+        plate = get_base_plate(generator, template, logo_path, timer)
+    canvas = compose_image(generator, template.spec, plate, product_cutout, context, timer)
+
     # Save
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-    generator.save_image(canvas, temp_file.name)
-    
-    return temp_file.name
\ No newline at end of file
+    return generator.save_image_async(canvas, output, get_output_preset(template), timer)
+
+
+def get_base_plate(generator, template, logo_path, timer=None):
+    """A template's base plate from this process's plate cache, built on a miss"""
+    return plate_cache.get_or_build(
+        base_plate_key(template, generator, logo_path),
+        lambda: build_base_plate(generator, template, logo_path, timer)
+    )
+
+
+def compose_image(generator, spec, plate, product_cutout, context, timer):
+    """
+    Render the per-product layers of a template onto a copy of its base plate:
+    the product, dynamic text, then the static layers above the product.
+    Returns the canvas (see ImageGenerator.start_canvas).
+    """
+    with timer.stage('canvas'):
+        canvas = generator.start_canvas(plate.base)
+
+    # 2. Place Product, from the smallest working resolution that is large enough
+    prod_pos = spec.get('product_position', {})
+    with timer.stage('product'):
+        product_image, scale = product_cutout.for_scale(prod_pos.get('scale', 1.0))
+        canvas = generator.place_product(
+            canvas,
+            product_image,
+            position=(prod_pos.get('x', 1000), prod_pos.get('y', 1000)),
+            scale=scale,
+            rotate=prod_pos.get('rotate', 0),
+            quality=prod_pos.get('quality'),
+        )
+
+    # 3. Add Dynamic Text
+    with timer.stage('text'):
+        for text_spec in spec.get('text', []):
+            if is_dynamic_text(text_spec):
+                canvas = add_text_from_spec(generator, canvas, text_spec, context)
+
+    # 4. Static layers above the product
+    if plate.top is not None:
+        with timer.stage('logo'):
+            canvas = generator.composite(canvas, plate.top, plate.top_offset)
+    return canvas
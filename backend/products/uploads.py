@@ -0,0 +1,108 @@
+"""
+Background upload stage for rendered output.
+
+Storage writes (one PUT per file on S3, multipart above the transfer
+threshold) run in a small pool of threads, so the render loop keeps
+compositing while earlier outputs upload. The pool's threads live as long as
+the process, and django-storages keeps one boto3 client per thread, so each
+thread reuses its connections from one upload to the next.
+
+The queue is bounded: submit() blocks once RENDER_UPLOAD_QUEUE uploads are
+waiting or running, so a slow store holds rendering back instead of piling
+up encoded images in memory. Transient failures are retried with
+exponential backoff and jitter.
+
+Upload threads only touch storage; database rows are written by the caller
+once an upload's future resolves.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+
+try:
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:  # boto3 is only installed for S3 storage
+    BotoCoreError = ClientError = None
+
+
+# S3 error codes worth another attempt; anything else 4xx is permanent
+RETRYABLE_CODES = {
+    'RequestTimeout', 'RequestTimeTooSkewed', 'SlowDown', 'Throttling',
+    'ThrottlingException', 'InternalError', 'ServiceUnavailable',
+}
+
+
+def is_retryable(error):
+    """Whether an upload failing with error may succeed if tried again"""
+    if ClientError is not None and isinstance(error, ClientError):
+        response = error.response or {}
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        return status >= 500 or response.get('Error', {}).get('Code') in RETRYABLE_CODES
+    if BotoCoreError is not None and isinstance(error, BotoCoreError):
+        # Connection resets, timeouts, incomplete reads
+        return True
+    return isinstance(error, OSError) and not isinstance(error, (FileNotFoundError, PermissionError))
+
+
+class UploadPool:
+    """
+    Threads that run storage writes, at most max_pending of them queued or
+    running at once. Each call is tried up to attempts times; the wait before
+    retry n is backoff * 2**(n-1) seconds, scaled by a random 0.5-1.5.
+    """
+
+    def __init__(self, max_workers=4, max_pending=8, attempts=4, backoff=0.5):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._slots = threading.BoundedSemaphore(max(max_pending, max_workers))
+
+    def submit(self, func, *args, timer=None):
+        """
+        Run func(*args) in the pool, with retries; returns a Future of its result.
+        Blocks while the queue is full. The upload's own duration, retries
+        included, is recorded on timer as 'storage'.
+        """
+        call = timer.timed('storage', self._call) if timer else self._call
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(call, func, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _call(self, func, args):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt == self.attempts or not is_retryable(e):
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                print(f"Warning: Upload failed (attempt {attempt}/{self.attempts}), "
+                      f"retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_upload_pool():
+    """Process-wide upload pool, sized from Django settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from django.conf import settings
+            _pool = UploadPool(
+                max_workers=getattr(settings, 'RENDER_UPLOAD_THREADS', 4),
+                max_pending=getattr(settings, 'RENDER_UPLOAD_QUEUE', 8),
+                attempts=getattr(settings, 'RENDER_UPLOAD_ATTEMPTS', 4),
+                backoff=getattr(settings, 'RENDER_UPLOAD_BACKOFF', 0.5),
+            )
+    return _pool
@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, TemplateViewSet, ImageAssetViewSet, LogoViewSet
+from .views import ProductViewSet, BatchJobViewSet, TemplateViewSet, ImageAssetViewSet, LogoViewSet
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'templates', TemplateViewSet, basename='template')
 router.register(r'images', ImageAssetViewSet, basename='image')
 router.register(r'logos', LogoViewSet, basename='logo')
+router.register(r'batches', BatchJobViewSet, basename='batch')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -5,30 +5,136 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, Greatest
 
-from .models import Product, ImageAsset, Template, GenerationJob, Logo
+from .archives import job_images, zip_response
+from .coalesce import get_or_create_job
+from .conditional import conditional_response, make_etag, set_validators
+from .cutouts import CUTOUT_KINDS
+from .models import Product, ImageAsset, Template, BatchJob, GenerationJob, GeneratedImage, Logo
+from .pagination import CatalogCursorPagination
+from .registry import registry
 from .serializers import (
-    ProductSerializer, ProductCreateSerializer, ImageAssetSerializer,
-    TemplateSerializer, GenerationJobSerializer, LogoSerializer
+    ProductSerializer, ProductListSerializer, ProductCreateSerializer, ImageAssetSerializer,
+    TemplateSerializer, GenerationJobSerializer, LogoSerializer,
+    BatchJobSerializer, BatchJobCreateSerializer
 )
 
 # REMOVED: from .tasks import generate_product_images (This caused the crash)
 
+def with_activity(queryset):
+    """
+    Annotate products with image counts and the time anything about them last
+    changed. Correlated subqueries, so only the rows actually returned pay.
+    """
+    assets = ImageAsset.objects.filter(product=OuterRef('pk')).exclude(kind__in=CUTOUT_KINDS)
+    generated = GeneratedImage.objects.filter(product=OuterRef('pk'))
+
+    def aggregate(related, expression):
+        return Subquery(
+            related.order_by().values('product').annotate(value=expression).values('value')[:1]
+        )
+
+    return queryset.annotate(
+        asset_count=Coalesce(aggregate(assets, Count('id')), 0, output_field=IntegerField()),
+        generated_count=Coalesce(aggregate(generated, Count('id')), 0, output_field=IntegerField()),
+        last_activity=Greatest(
+            F('updated_at'),
+            Coalesce(aggregate(assets, Max('created_at')), F('updated_at')),
+            Coalesce(aggregate(generated, Max('created_at')), F('updated_at')),
+        ),
+    ).annotate(image_count=F('asset_count') + F('generated_count'))
+
+
+def with_progress(queryset):
+    """
+    Annotate batches with their job counts by status and the images their jobs
+    generated (read by BatchJobSerializer), as correlated subqueries: one
+    query for a whole page of batches.
+    """
+    jobs = GenerationJob.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+    images = GeneratedImage.objects.filter(job__batch=OuterRef('pk')).order_by().values('job__batch')
+
+    def count(related):
+        return Coalesce(
+            Subquery(related.annotate(value=Count('id')).values('value')[:1]), 0,
+            output_field=IntegerField(),
+        )
+
+    return queryset.annotate(
+        **{f"{state}_count": count(jobs.filter(status=state)) for state, _ in BatchJob.STATUS_CHOICES},
+        images_generated=count(images),
+    )
+
+
+def product_validators(product):
+    etag = make_etag('product', product.id, product.last_activity, product.asset_count, product.generated_count)
+    return etag, product.last_activity
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     parser_classes = [JSONParser, MultiPartParser, FormParser]
+    pagination_class = CatalogCursorPagination
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Only the columns the list serializer reads
+            return with_activity(queryset.only(
+                'id', 'name', 'sku', 'product_image', 'created_at', 'updated_at'
+            ))
+        if self.action in ('retrieve', 'update', 'partial_update'):
+            return queryset.prefetch_related(
+                Prefetch(
+                    'assets',
+                    queryset=ImageAsset.objects.exclude(kind__in=CUTOUT_KINDS).order_by('id'),
+                    to_attr='visible_assets',
+                ),
+                Prefetch(
+                    'generated_images',
+                    queryset=GeneratedImage.objects.select_related('template').order_by('-id'),
+                ),
+            )
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ProductCreateSerializer
+        if self.action == 'list':
+            return ProductListSerializer
         return ProductSerializer
     
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        # ETag only: a page's membership can change without any row getting newer
+        etag = make_etag(
+            'products', request.get_full_path(),
+            [(p.id, p.last_activity, p.image_count) for p in page],
+        )
+        not_modified = conditional_response(request, etag)
+        if not_modified:
+            return not_modified
+        serializer = self.get_serializer(page, many=True)
+        return set_validators(self.get_paginated_response(serializer.data), etag)
+    
+    def retrieve(self, request, *args, **kwargs):
+        # Validators come from one indexed lookup; images are only loaded on a cache miss
+        stamp = get_object_or_404(with_activity(Product.objects.only('id', 'updated_at')), pk=kwargs['pk'])
+        etag, last_modified = product_validators(stamp)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
+        serializer = self.get_serializer(self.get_object())
+        return set_validators(Response(serializer.data), etag, last_modified)
+    
     @action(detail=True, methods=['post'], parser_classes=[JSONParser])
     def generate_images(self, request, pk=None):
         """Trigger image generation for a product"""
         # --- FIX: Local import to prevent circular dependency ---
-        from .tasks import generate_product_images
+        from .tasks import generate_product_images, job_queue
         # ------------------------------------------------------
 
         product = self.get_object()
@@ -36,23 +142,26 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         # If no templates specified, use all active templates
         if not template_ids:
-            templates = Template.objects.filter(is_active=True)
-            template_ids = list(templates.values_list('id', flat=True))
-        
-        # Create generation job
-        job = GenerationJob.objects.create(
-            product=product,
-            templates_used=template_ids,
-            status='pending'
-        )
+            registry.sync()
+            template_ids = registry.active_template_ids()
         
-        # Trigger async task
-        generate_product_images.delay(job.id)
+        def start_job():
+            job = GenerationJob.objects.create(
+                product=product,
+                templates_used=template_ids,
+                status='pending'
+            )
+            # Trigger async task, in the interactive lane: never queued behind a batch
+            generate_product_images.apply_async((job.id,), queue=job_queue(job, 'segment'))
+            return job
+
+        # A repeat of a request whose job is still queued or running gets that job back
+        job, created = get_or_create_job(product, template_ids, start_job)
         
         return Response({
             'job_id': job.id,
-            'status': 'pending',
-            'message': 'Image generation started'
+            'status': job.status,
+            'message': 'Image generation started' if created else 'Image generation already in progress'
         }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['get'])
@@ -61,10 +170,11 @@ class ProductViewSet(viewsets.ModelViewSet):
         product = self.get_object()
         job_id = request.query_params.get('job_id')
         
+        jobs = GenerationJob.objects.select_related('product').filter(product=product)
         if job_id:
-            job = get_object_or_404(GenerationJob, id=job_id, product=product)
+            job = get_object_or_404(jobs, id=job_id)
         else:
-            job = product.jobs.first()
+            job = jobs.first()
         
         if not job:
             return Response({'error': 'No generation jobs found'}, 
@@ -73,6 +183,57 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = GenerationJobSerializer(job)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """ZIP of the product's generated images, or of one job's (?job_id=)"""
+        product = self.get_object()
+        images = GeneratedImage.objects.filter(product=product)
+        filename = f"product-{product.id}"
+        job_id = request.query_params.get('job_id')
+        if job_id:
+            job = get_object_or_404(GenerationJob, product=product, id=job_id)
+            images = images.filter(job_images(GenerationJob.objects.filter(id=job.id)))
+            filename += f"-job-{job.id}"
+        return zip_response(images, f"{filename}.zip")
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchJobViewSet(viewsets.ModelViewSet):
+    """Bulk generation: one request regenerates a filtered set of products (or the whole catalog)"""
+    queryset = BatchJob.objects.all().order_by('-created_at')
+    parser_classes = [JSONParser]
+    pagination_class = CatalogCursorPagination
+    # Batches are created and inspected, never edited
+    http_method_names = ['get', 'post', 'head', 'options']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'create':
+            return queryset
+        return with_progress(queryset)
+    
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return BatchJobCreateSerializer
+        return BatchJobSerializer
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batch = serializer.save()
+        return Response({
+            'batch_id': batch.id,
+            'status': 'pending',
+            'message': 'Batch generation started'
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """ZIP of every image the batch's jobs generated or kept (skipped as unchanged)"""
+        batch = self.get_object()
+        images = GeneratedImage.objects.filter(job_images(batch.jobs.all()))
+        return zip_response(images, f"batch-{batch.id}.zip")
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class TemplateViewSet(viewsets.ModelViewSet):
@@ -98,9 +259,11 @@ class ImageAssetViewSet(viewsets.ModelViewSet):
     queryset = ImageAsset.objects.all()
     serializer_class = ImageAssetSerializer
     parser_classes = [JSONParser, MultiPartParser, FormParser]
+    pagination_class = CatalogCursorPagination
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Cutouts are internal render inputs, as in the product detail
+        queryset = super().get_queryset().exclude(kind__in=CUTOUT_KINDS)
         product_id = self.request.query_params.get('product_id')
         kind = self.request.query_params.get('kind')
         
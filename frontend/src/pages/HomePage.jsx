@@ -74,9 +74,9 @@ const HomePage = () => {
             >
               <div className="p-5">
                 <div className="flex items-center justify-center h-48 bg-gray-100 rounded-md mb-4">
-                  {product.images && product.images.length > 0 ? (
+                  {product.thumbnail_url ? (
                     <img
-                      src={product.images[0].url}
+                      src={product.thumbnail_url}
                       alt={product.name}
                       className="max-h-full max-w-full object-contain"
                     />
@@ -90,7 +90,7 @@ const HomePage = () => {
                 <p className="mt-1 text-sm text-gray-500">SKU: {product.sku}</p>
                 <div className="mt-3 flex items-center justify-between">
                   <span className="text-sm text-gray-500">
-                    {product.images?.length || 0} images
+                    {product.image_count || 0} images
                   </span>
                   <span className="text-sm text-blue-600 font-medium">
                     View details →
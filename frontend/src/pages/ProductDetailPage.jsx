@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getProduct, generateImages, checkJobStatus } from '../services/api';
+import { getProduct, generateImages, checkJobStatus, subscribeToJob, getDownloadUrl } from '../services/api';
 import { Download, Loader, CheckCircle, XCircle, ArrowLeft } from 'lucide-react';
 
 const ProductDetailPage = () => {
@@ -10,20 +10,30 @@ const ProductDetailPage = () => {
   const [loading, setLoading] = useState(true);
   const [generating, setGenerating] = useState(false);
   const [jobStatus, setJobStatus] = useState(null);
+  const [progress, setProgress] = useState(null);
 
   useEffect(() => {
     loadProduct();
   }, [id]);
 
   useEffect(() => {
+    if (!jobStatus || jobStatus.status !== 'processing') return;
     let interval;
-    if (jobStatus && jobStatus.status === 'processing') {
-      interval = setInterval(() => {
-        checkStatus(jobStatus.id);
-      }, 3000);
-    }
-    return () => clearInterval(interval);
-  }, [jobStatus]);
+    // Follow the job's event stream; fall back to polling if it's unavailable
+    const unsubscribe = subscribeToJob(jobStatus.id, {
+      onProgress: setProgress,
+      onDone: () => checkStatus(jobStatus.id),
+      onError: () => {
+        interval = setInterval(() => {
+          checkStatus(jobStatus.id);
+        }, 3000);
+      },
+    });
+    return () => {
+      unsubscribe();
+      clearInterval(interval);
+    };
+  }, [jobStatus?.id, jobStatus?.status]);
 
   const loadProduct = async () => {
     try {
@@ -40,6 +50,7 @@ const ProductDetailPage = () => {
     setGenerating(true);
     try {
       const response = await generateImages(id);
+      setProgress(null);
       setJobStatus({
         id: response.job_id,
         status: 'processing'
@@ -73,14 +84,10 @@ const ProductDetailPage = () => {
     document.body.removeChild(link);
   };
 
-  const downloadAll = () => {
-    product.images.forEach((image, index) => {
-      if (image.kind !== 'original') {
-        setTimeout(() => {
-          downloadImage(image.url, `${product.sku}_${image.kind}.png`);
-        }, index * 500);
-      }
-    });
+  // One streamed ZIP from the server instead of a download per image
+  const downloadAll = (jobId = null) => {
+    const name = jobId ? `product-${product.id}-job-${jobId}` : `product-${product.id}`;
+    downloadImage(getDownloadUrl(product.id, jobId), `${name}.zip`);
   };
 
   if (loading) {
@@ -99,8 +106,12 @@ const ProductDetailPage = () => {
     );
   }
 
-  const generatedImages = product.images.filter(img => img.kind !== 'original');
-  const hasGeneratedImages = generatedImages.length > 0;
+  // Uploaded assets and generated images share one grid; ids are only unique per list
+  const allImages = [
+    ...product.images.map((image) => ({ ...image, key: `asset-${image.id}` })),
+    ...product.generated_images.map((image) => ({ ...image, key: `generated-${image.id}` })),
+  ];
+  const hasGeneratedImages = product.generated_images.length > 0;
 
   return (
     <div className="px-4 sm:px-0">
@@ -126,7 +137,7 @@ const ProductDetailPage = () => {
           <div className="flex space-x-3">
             {hasGeneratedImages && (
               <button
-                onClick={downloadAll}
+                onClick={() => downloadAll()}
                 className="inline-flex items-center px-4 py-2 border border-gray-300 rounded-md shadow-sm text-sm font-medium text-gray-700 bg-white hover:bg-gray-50"
               >
                 <Download className="mr-2 h-4 w-4" />
@@ -170,9 +181,22 @@ const ProductDetailPage = () => {
                 {jobStatus.status === 'failed' && 'Generation Failed'}
                 {jobStatus.status === 'processing' && 'Generating Images...'}
               </p>
+              {jobStatus.status === 'processing' && progress && progress.total > 0 && (
+                <p className="text-sm mt-1">
+                  {progress.done} of {progress.total} templates done
+                </p>
+              )}
               {jobStatus.result && (
                 <p className="text-sm mt-1">
                   Generated {jobStatus.result.generated_count} images
+                  {jobStatus.status === 'completed' && (
+                    <button
+                      onClick={() => downloadAll(jobStatus.id)}
+                      className="ml-2 text-blue-600 hover:underline"
+                    >
+                      Download these
+                    </button>
+                  )}
                 </p>
               )}
               {jobStatus.error_message && (
@@ -187,14 +211,14 @@ const ProductDetailPage = () => {
       <div className="bg-white shadow rounded-lg p-6">
         <h2 className="text-xl font-semibold text-gray-900 mb-4">Images</h2>
         
-        {product.images.length === 0 ? (
+        {allImages.length === 0 ? (
           <div className="text-center py-12 text-gray-500">
             No images yet. Click "Generate Images" to create product variations.
           </div>
         ) : (
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-            {product.images.map((image) => (
-              <div key={image.id} className="border rounded-lg overflow-hidden">
+            {allImages.map((image) => (
+              <div key={image.key} className="border rounded-lg overflow-hidden">
                 <div className="aspect-square bg-gray-100 flex items-center justify-center p-4">
                   <img
                     src={image.url}
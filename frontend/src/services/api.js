@@ -66,6 +66,34 @@ export const checkJobStatus = async (productId, jobId) => {
   return response.data;
 };
 
+// URL of a streamed ZIP of a product's generated images, or of one job's.
+// Opened by the browser directly, so the archive isn't buffered in memory.
+export const getDownloadUrl = (productId, jobId = null) => {
+  const url = `${API_BASE_URL}/products/${productId}/download/`;
+  return jobId ? `${url}?job_id=${jobId}` : url;
+};
+
+// Live job progress over server-sent events. Each event carries the full
+// progress snapshot. Returns a function that closes the stream.
+export const subscribeToJob = (jobId, { onProgress, onDone, onError }) => {
+  const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events/`);
+  const handleEvent = (event) => {
+    const snapshot = JSON.parse(event.data);
+    onProgress(snapshot);
+    if (snapshot.status === 'completed' || snapshot.status === 'failed') {
+      source.close();
+      onDone(snapshot);
+    }
+  };
+  ['snapshot', 'status', 'template'].forEach((name) => source.addEventListener(name, handleEvent));
+  // The stream is closed by us once the job is done, so any error means it's unavailable
+  source.onerror = () => {
+    source.close();
+    onError();
+  };
+  return () => source.close();
+};
+
 // Templates
 export const getTemplates = async (kind = null) => {
   const url = kind ? `/templates/by_kind/?kind=${kind}` : '/templates/';